@@ -0,0 +1,548 @@
+#!/usr/bin/python3
+import argparse
+import gzip
+import json
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .constants import ImpVar
+from .errors import MDownloaderError
+
+try:
+    import zstandard
+    from zstandard import ZstdError
+except ModuleNotFoundError:
+    zstandard = None
+
+    class ZstdError(Exception):
+        pass
+
+
+
+class CacheStore:
+
+    # The zlib fallback notice is only shown once a run
+    fallback_notice_shown = False
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.db_path = root.joinpath(ImpVar.CACHE_DB_NAME)
+        self.lock = threading.Lock()
+        # The cache is used by the chapter workers as well as the main thread
+        self.connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS cache (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL DEFAULT '',
+                cache_date TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                codec TEXT NOT NULL DEFAULT 'zlib'
+            );
+            CREATE INDEX IF NOT EXISTS cache_type ON cache (type, cache_date);
+            CREATE TABLE IF NOT EXISTS cache_meta (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL
+            );
+        """)
+
+        # Databases made before the codec was stored only have zlib payloads
+        columns = [c[1] for c in self.connection.execute('PRAGMA table_info(cache)')]
+        if 'codec' not in columns:
+            self.connection.execute("ALTER TABLE cache ADD COLUMN codec TEXT NOT NULL DEFAULT 'zlib'")
+        self.connection.commit()
+
+        self.level = ImpVar.CACHE_COMPRESSION_LEVEL
+        self.codec = ImpVar.CACHE_CODEC if zstandard is not None else 'zlib'
+
+        if zstandard is None and ImpVar.CACHE_CODEC != 'zlib' and not CacheStore.fallback_notice_shown:
+            CacheStore.fallback_notice_shown = True
+            print('zstandard is not installed, the cache is compressed with zlib. Run "pip install zstandard" to use zstd.')
+        self.dictionary = None
+        self.load_dictionary()
+        self.fill_types()
+
+    def load_dictionary(self) -> None:
+        """Load the trained zstd dictionary if there is one."""
+        self.dictionary = None
+        self.compressor = None
+        self.decompressor = None
+        self.dict_compressor = None
+        self.dict_decompressor = None
+
+        if zstandard is None:
+            return
+
+        self.compressor = zstandard.ZstdCompressor(level=self.level)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+        row = self.connection.execute("SELECT value FROM cache_meta WHERE key = 'zstd_dict'").fetchone()
+        if row is not None:
+            self.dictionary = zstandard.ZstdCompressionDict(row[0])
+            self.dict_compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self.dictionary)
+            self.dict_decompressor = zstandard.ZstdDecompressor(dict_data=self.dictionary)
+
+    def encode(self, cache_json: dict) -> bytes:
+        """Serialise the cache data.
+
+        Args:
+            cache_json (dict): The cache data.
+
+        Returns:
+            bytes: The uncompressed json.
+        """
+        return json.dumps(cache_json, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def compress(self, cache_bytes: bytes, codec: str='') -> Tuple[str, bytes]:
+        """Compress the serialised cache data, the lock needs to be held.
+
+        Args:
+            cache_bytes (bytes): The uncompressed json.
+            codec (str, optional): The codec to use. Defaults to the codec in the settings.
+
+        Returns:
+            Tuple[str, bytes]: The codec used and the compressed data.
+        """
+        codec = codec or self.codec
+
+        if codec == 'zstd' and self.dict_compressor is not None:
+            return 'zstd-dict', self.dict_compressor.compress(cache_bytes)
+        if codec in ('zstd', 'zstd-dict') and self.compressor is not None:
+            return 'zstd', self.compressor.compress(cache_bytes)
+        return 'zlib', zlib.compress(cache_bytes, self.level)
+
+    def decompress(self, codec: str, payload: bytes) -> bytes:
+        """Decompress the stored cache data, the lock needs to be held.
+
+        Args:
+            codec (str): The codec the data was compressed with.
+            payload (bytes): The compressed data.
+
+        Raises:
+            zlib.error: The data can't be decompressed with the codecs available.
+
+        Returns:
+            bytes: The uncompressed json.
+        """
+        if codec == 'zlib':
+            return zlib.decompress(payload)
+        if codec == 'zstd' and self.decompressor is not None:
+            return self.decompressor.decompress(payload)
+        if codec == 'zstd-dict' and self.dict_decompressor is not None:
+            return self.dict_decompressor.decompress(payload)
+        raise zlib.error(f"Can't decompress {codec} data.")
+
+    def get_type(self, cache_json: dict) -> str:
+        """Get the type of data being cached, e.g. manga, chapter or scanlation_group.
+
+        Args:
+            cache_json (dict): The cache data.
+
+        Returns:
+            str: The type of the data, empty if it can't be found.
+        """
+        data = cache_json.get("data")
+        if not isinstance(data, dict):
+            return ''
+
+        # The data is the api response, the type is in the response's data
+        response_data = data.get("data")
+        if isinstance(response_data, dict):
+            return response_data.get("type", '')
+        return data.get("type", '')
+
+    def fill_types(self) -> None:
+        """Fill in the type of the rows saved before the type was read from the api response, only done once."""
+        if self.connection.execute("SELECT 1 FROM cache_meta WHERE key = 'types_filled'").fetchone() is not None:
+            return
+
+        rows = self.connection.execute("SELECT id, codec, payload FROM cache WHERE type = ''").fetchall()
+        types = []
+
+        for download_id, codec, payload in rows:
+            try:
+                cache_type = self.get_type(json.loads(self.decompress(codec, payload)))
+            except (zlib.error, ZstdError, json.JSONDecodeError):
+                continue
+
+            if cache_type:
+                types.append((cache_type, download_id))
+
+        with self.connection:
+            self.connection.executemany('UPDATE cache SET type = ? WHERE id = ?', types)
+            self.connection.execute("INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('types_filled', ?)", (b'1',))
+
+    def put(self, download_id: str, cache_json: dict) -> int:
+        """Insert or replace the cache row of the id.
+
+        Args:
+            download_id (str): The id of the data to cache.
+            cache_json (dict): The cache data.
+
+        Returns:
+            int: The size of the uncompressed data.
+        """
+        cache_bytes = self.encode(cache_json)
+
+        with self.lock:
+            codec, payload = self.compress(cache_bytes)
+            row = (download_id, self.get_type(cache_json), cache_json["cache_date"], payload, codec)
+
+            # The row is replaced in a single transaction, a crash can't leave half written data
+            with self.connection:
+                self.connection.execute('INSERT OR REPLACE INTO cache (id, type, cache_date, payload, codec) VALUES (?, ?, ?, ?, ?)', row)
+        return len(cache_bytes)
+
+    def get(self, download_id: str) -> Tuple[Optional[dict], int]:
+        """Get the cache row of the id.
+
+        Args:
+            download_id (str): The id of the cache data to load.
+
+        Returns:
+            Tuple[Optional[dict], int]: The cache data, None if the id isn't cached, and the size of the uncompressed data.
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT codec, payload FROM cache WHERE id = ?', (download_id,)).fetchone()
+            if row is None:
+                return None, 0
+
+            try:
+                cache_bytes = self.decompress(*row)
+            except (zlib.error, ZstdError):
+                return None, 0
+
+        try:
+            return json.loads(cache_bytes), len(cache_bytes)
+        except json.JSONDecodeError:
+            return None, 0
+
+    def train_dictionary(self, dict_size: int) -> int:
+        """Train a zstd dictionary on the cached data and recompress the cache with it.
+
+        The chapters are used as separate samples as they make up most of the cache and are very alike.
+
+        Args:
+            dict_size (int): The size of the dictionary in bytes.
+
+        Raises:
+            MDownloaderError: zstandard isn't installed or there isn't enough data to train on.
+
+        Returns:
+            int: The amount of rows recompressed.
+        """
+        if zstandard is None:
+            raise MDownloaderError('zstandard needs to be installed to train a dictionary.')
+
+        samples = []
+        with self.lock:
+            rows = self.connection.execute('SELECT codec, payload FROM cache').fetchall()
+            for codec, payload in rows:
+                try:
+                    cache_json = json.loads(self.decompress(codec, payload))
+                except (zlib.error, ZstdError, json.JSONDecodeError):
+                    continue
+
+                samples.append(self.encode(cache_json.get("data", {})))
+                samples.extend(self.encode(c) for c in cache_json.get("chapters", []))
+
+        if len(samples) < 100:
+            raise MDownloaderError('Not enough cached data to train a dictionary.')
+
+        dictionary = zstandard.train_dictionary(dict_size, samples, level=self.level)
+
+        with self.lock:
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('zstd_dict', ?)", (dictionary.as_bytes(),))
+
+            # Decompress with the old dictionary before switching to the new one
+            recompressed = []
+            for download_id, codec, payload in self.connection.execute('SELECT id, codec, payload FROM cache').fetchall():
+                try:
+                    recompressed.append((download_id, self.decompress(codec, payload)))
+                except (zlib.error, ZstdError):
+                    continue
+            self.load_dictionary()
+
+            with self.connection:
+                for download_id, cache_bytes in recompressed:
+                    codec, payload = self.compress(cache_bytes, 'zstd')
+                    self.connection.execute('UPDATE cache SET codec = ?, payload = ? WHERE id = ?', (codec, payload, download_id))
+
+        return len(recompressed)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self.lock:
+            self.connection.close()
+
+
+class CacheMemo:
+
+    def __init__(self, max_items: int, max_size: int) -> None:
+        self.max_items = max_items
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, download_id: str) -> Optional[dict]:
+        """Get the cache data of the id if it's in memory.
+
+        A new copy is made on every hit, so changing it doesn't change the data in memory.
+
+        Args:
+            download_id (str): The id of the cache data.
+
+        Returns:
+            Optional[dict]: The cache data, None if it isn't in memory.
+        """
+        with self.lock:
+            entry = self.entries.get(download_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(download_id)
+            self.hits += 1
+            snapshot = entry[0]
+
+        return pickle.loads(snapshot)
+
+    def put(self, download_id: str, cache_json: dict, size: int) -> None:
+        """Keep a snapshot of the cache data in memory, removing the least recently used data when full.
+
+        Args:
+            download_id (str): The id of the cache data.
+            cache_json (dict): The cache data.
+            size (int): The size of the data when serialised.
+        """
+        with self.lock:
+            self.discard(download_id)
+
+            # Don't let a single large entry push everything else out
+            if self.max_items <= 0 or size > self.max_size:
+                return
+
+            # Pickled so the data can't be changed through the dicts the callers hold
+            self.entries[download_id] = (pickle.dumps(cache_json, pickle.HIGHEST_PROTOCOL), size)
+            self.size += size
+
+            while len(self.entries) > self.max_items or self.size > self.max_size:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def discard(self, download_id: str) -> None:
+        """Remove the id from memory, the lock needs to be held.
+
+        Args:
+            download_id (str): The id of the cache data.
+        """
+        entry = self.entries.pop(download_id, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+def load_legacy_cache(cache_file_path: Path) -> dict:
+    """Read a cache file from before the cache was stored in a database.
+
+    Args:
+        cache_file_path (Path): The path of the .json.gz file.
+
+    Returns:
+        dict: The cache's data, empty if the file can't be read.
+    """
+    try:
+        with gzip.open(cache_file_path, 'r') as cache_json_fp:
+            return json.loads(cache_json_fp.read().decode('utf-8'))
+    except (FileNotFoundError, json.JSONDecodeError, gzip.BadGzipFile, EOFError):
+        return {}
+
+
+def migrate_cache(root: Path, delete: bool=False) -> int:
+    """Move the old .json.gz cache files into the cache database.
+
+    Args:
+        root (Path): The cache folder.
+        delete (bool, optional): Delete the old files once they've been moved. Defaults to False.
+
+    Returns:
+        int: The amount of files moved.
+    """
+    store = CacheStore(root)
+    migrated = 0
+
+    try:
+        for cache_file_path in root.glob('*.json.gz'):
+            cache_json = load_legacy_cache(cache_file_path)
+            if not cache_json or "cache_date" not in cache_json:
+                print(f'Skipping {cache_file_path.name}, could not read the file.')
+                continue
+
+            download_id = cache_file_path.name[:-len('.json.gz')]
+            existing, _ = store.get(download_id)
+
+            # Don't replace data newer than the file
+            if existing is None or existing.get("cache_date", '') < cache_json["cache_date"]:
+                store.put(download_id, cache_json)
+            migrated += 1
+
+            if delete:
+                cache_file_path.unlink()
+    finally:
+        store.close()
+
+    return migrated
+
+
+def make_benchmark_cache(chapter_count: int) -> dict:
+    """Make a manga cache with a lot of chapters, for when there's no real cache to benchmark.
+
+    Args:
+        chapter_count (int): The amount of chapters to make.
+
+    Returns:
+        dict: The cache data.
+    """
+    chapters = []
+    for i in range(chapter_count):
+        chapters.append({
+            "result": "ok",
+            "data": {
+                "id": str(uuid.uuid4()),
+                "type": "chapter",
+                "attributes": {
+                    "volume": str(i // 10 + 1),
+                    "chapter": str(chapter_count - i),
+                    "title": f"Chapter {chapter_count - i}",
+                    "translatedLanguage": "en",
+                    "hash": uuid.uuid4().hex,
+                    "data": [f"x{p}-{uuid.uuid4().hex}.png" for p in range(20)],
+                    "dataSaver": [f"x{p}-{uuid.uuid4().hex}.jpg" for p in range(20)],
+                    "publishAt": "2021-05-22T21:06:32+00:00",
+                    "createdAt": "2021-05-22T21:06:32+00:00",
+                    "updatedAt": "2021-05-22T21:06:32+00:00",
+                    "version": 1
+                }
+            },
+            "relationships": [
+                {"id": str(uuid.uuid4()), "type": "scanlation_group"},
+                {"id": str(uuid.uuid4()), "type": "manga"},
+                {"id": str(uuid.uuid4()), "type": "user"}
+            ]
+        })
+
+    return {"cache_date": "2021-05-22 21:06:32.000000", "data": {"data": {"type": "manga"}}, "covers": [], "chapters": chapters}
+
+
+def time_best(func, runs: int=3) -> float:
+    """Time a function, keeping the fastest run.
+
+    Args:
+        func (Callable): The function to time.
+        runs (int, optional): How many times to run it. Defaults to 3.
+
+    Returns:
+        float: The fastest time in milliseconds.
+    """
+    times = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start_time)
+    return min(times) * 1000
+
+
+def benchmark_cache(root: Path, download_id: str='', chapter_count: int=10000) -> None:
+    """Compare saving and loading a cache entry in the old file format and with each codec.
+
+    Args:
+        root (Path): The cache folder.
+        download_id (str, optional): The id to benchmark. Defaults to the largest entry in the cache.
+        chapter_count (int, optional): The amount of chapters to make if there's no cache. Defaults to 10000.
+    """
+    store = CacheStore(root)
+
+    try:
+        if not download_id:
+            row = store.connection.execute('SELECT id FROM cache ORDER BY length(payload) DESC LIMIT 1').fetchone()
+            download_id = row[0] if row is not None else ''
+
+        cache_json, _ = store.get(download_id) if download_id else (None, 0)
+        if cache_json is None:
+            print(f'Using a made up cache with {chapter_count} chapters.')
+            cache_json = make_benchmark_cache(chapter_count)
+        else:
+            print(f'Using {download_id} with {len(cache_json.get("chapters", []))} chapters.')
+
+        results = []
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            legacy_path = Path(tmp_dir).joinpath('legacy.json.gz')
+
+            def legacy_save():
+                with gzip.open(legacy_path, 'w') as cache_json_fp:
+                    cache_json_fp.write(json.dumps(cache_json, indent=4, ensure_ascii=False).encode('utf-8'))
+
+            results.append(('gzip json (old)', time_best(legacy_save), time_best(lambda: load_legacy_cache(legacy_path)), legacy_path.stat().st_size))
+
+        codecs = [('zlib', lambda cache_bytes: zlib.compress(cache_bytes, store.level))]
+        if store.compressor is not None:
+            codecs.append(('zstd', store.compressor.compress))
+        if store.dict_compressor is not None:
+            codecs.append(('zstd-dict', store.dict_compressor.compress))
+
+        with store.lock:
+            for codec, compress in codecs:
+                save = lambda: compress(store.encode(cache_json))
+                payload = save()
+                load = lambda: json.loads(store.decompress(codec, payload))
+                results.append((codec, time_best(save), time_best(load), len(payload)))
+    finally:
+        store.close()
+
+    print(f'{"Format":<18}{"Save (ms)":>12}{"Load (ms)":>12}{"Size (KB)":>12}')
+    for name, save_time, load_time, size in results:
+        print(f'{name:<18}{save_time:>12.1f}{load_time:>12.1f}{size / 1024:>12.1f}')
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Move the old .json.gz cache files into the cache database.')
+    parser.add_argument('--path', '-p', default=ImpVar.CACHE_PATH, help='The cache folder.')
+    parser.add_argument('--delete', '-d', default=False, const=True, nargs='?', help='Delete the old cache files after moving them.')
+    parser.add_argument('--train', default=False, const=True, nargs='?', help='Train a zstd dictionary on the cache and recompress it. Needs zstandard.')
+    parser.add_argument('--benchmark', default=False, const=True, nargs='?',
+        help='Compare the cache codecs. Pass an id to use that cache entry, otherwise the largest entry is used.')
+
+    args = parser.parse_args()
+    cache_root = Path(args.path)
+
+    if not cache_root.exists():
+        print(f"{cache_root} doesn't exist.")
+    elif args.benchmark:
+        benchmark_cache(cache_root, args.benchmark if isinstance(args.benchmark, str) else '')
+    else:
+        migrated_count = migrate_cache(cache_root, bool(args.delete))
+        print(f'Moved {migrated_count} cache file(s) into {cache_root.joinpath(ImpVar.CACHE_DB_NAME)}.')
+
+        if args.train:
+            cache_store = CacheStore(cache_root)
+            try:
+                recompressed_count = cache_store.train_dictionary(ImpVar.CACHE_DICT_SIZE * 1024)
+                print(f'Trained a dictionary and recompressed {recompressed_count} cache entries.')
+            except MDownloaderError as e:
+                if e: print(e)
+            finally:
+                cache_store.close()
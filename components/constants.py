@@ -15,19 +15,61 @@ class ImpVar:
 
     TOKEN_FILE = os.getenv("TOKEN_FILE", '.mdauth')
     CACHE_PATH = os.getenv("CACHE_PATH", '.cache')
+    CACHE_DB_NAME = os.getenv("CACHE_DB_NAME", 'cache.db')
+    CACHE_CODEC = os.getenv("CACHE_CODEC", 'zstd')
+    CACHE_COMPRESSION_LEVEL = int(os.getenv("CACHE_COMPRESSION_LEVEL", 3))
+    CACHE_DICT_SIZE = int(os.getenv("CACHE_DICT_SIZE", 112))
+    LEDGER_PATH = os.getenv("LEDGER_PATH", os.path.join(CACHE_PATH, 'ledger.db'))
     DOWNLOAD_PATH = os.getenv("DOWNLOAD_PATH", 'downloads')
 
-    GLOBAL_TIME_TO_WAIT = int(os.getenv("GLOBAL_TIME_TO_WAIT", 2))
+    API_RATE_LIMIT = float(os.getenv("API_RATE_LIMIT", 5))
+    API_RATE_BURST = int(os.getenv("API_RATE_BURST", 5))
+    API_RETRIES = int(os.getenv("API_RETRIES", 3))
+    API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", 1))
+    API_RETRY_MAX_BACKOFF = float(os.getenv("API_RETRY_MAX_BACKOFF", 30))
+    API_RETRY_BUDGET = int(os.getenv("API_RETRY_BUDGET", 100))
     RETRY_MAX_TIMES = int(os.getenv("IMAGE_RETRY_MAX_TIMES", 3))
     TIME_TO_SLEEP = int(os.getenv("IMAGE_RETRY_SLEEP", 3))
+    SERVER_LEASE_TIME = int(os.getenv("SERVER_LEASE_TIME", 840))
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 95))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", 20))
+    HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 1))
+    HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", 200))
     CACHE_REFRESH_TIME = int(os.getenv("CACHE_REFRESH_TIME", 24))
+    CACHE_MEMORY_ITEMS = int(os.getenv("CACHE_MEMORY_ITEMS", 2000))
+    CACHE_MEMORY_SIZE = int(os.getenv("CACHE_MEMORY_SIZE", 64))
+
+    MAX_CHAPTER_DOWNLOADS = int(os.getenv("MAX_CHAPTER_DOWNLOADS", 3))
+    MAX_API_CALLS = int(os.getenv("MAX_API_CALLS", 1))
+    MAX_FEED_REQUESTS = int(os.getenv("MAX_FEED_REQUESTS", 4))
+    STREAM_QUEUE_PAGES = int(os.getenv("STREAM_QUEUE_PAGES", 2))
+    STREAM_BUFFER_CHAPTERS = int(os.getenv("STREAM_BUFFER_CHAPTERS", 100))
+    STREAM_CACHE_PAGES = int(os.getenv("STREAM_CACHE_PAGES", 10))
+    MAX_IMAGE_DOWNLOADS = int(os.getenv("MAX_IMAGE_DOWNLOADS", 20))
+    IMAGE_CHUNK_SIZE = int(os.getenv("IMAGE_CHUNK_SIZE", 65536))
+    PAGE_SPOOL_SIZE = int(os.getenv("PAGE_SPOOL_SIZE", 1048576))
+    WRITER_THREADS = int(os.getenv("WRITER_THREADS", 2))
+    WRITER_QUEUE_SIZE = int(os.getenv("WRITER_QUEUE_SIZE", 16))
+
+    CONNECTION_LIMIT = int(os.getenv("CONNECTION_LIMIT", 100))
+    CONNECTION_LIMIT_PER_HOST = int(os.getenv("CONNECTION_LIMIT_PER_HOST", 10))
+    DNS_CACHE_TIME = int(os.getenv("DNS_CACHE_TIME", 300))
+    KEEPALIVE_TIMEOUT = int(os.getenv("KEEPALIVE_TIMEOUT", 30))
+
+    REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", 500))
+    REPORT_BATCH_SIZE = int(os.getenv("REPORT_BATCH_SIZE", 20))
+    REPORT_SAMPLE_RATE = int(os.getenv("REPORT_SAMPLE_RATE", 5))
+    REPORT_TIMEOUT = int(os.getenv("REPORT_TIMEOUT", 10))
 
     GROUP_BLACKLIST_FILE = os.getenv("GROUP_BLACKLIST_FILE", 'group_blacklist.txt')
     GROUP_WHITELIST_FILE = os.getenv("GROUP_WHITELIST_FILE", 'group_whitelist.txt')
     USER_BLACKLIST_FILE = os.getenv("USER_BLACKLIST_FILE", 'user_blacklist.txt')
     USER_WHITELIST_FILE = os.getenv("USER_WHITELIST_FILE", 'user_whitelist.txt')
+    FILTER_LANGUAGES = os.getenv("FILTER_LANGUAGES", '')
+    FILTER_PUBLISHED_SINCE = os.getenv("FILTER_PUBLISHED_SINCE", '')
 
     ARCHIVE_EXTENSION = os.getenv("ARCHIVE_EXTENSION", 'cbz')
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
 
     MANGADEX_URL = '{}://{}.{}'.format(scheme, domain, tld)
     MANGADEX_API_URL = '{}://api.{}.{}'.format(scheme, domain, tld)
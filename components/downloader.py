@@ -1,36 +1,139 @@
 #!/usr/bin/python3
 import math
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import islice
+from typing import Iterator, Optional, Tuple, Union
 
-from .image_downloader import chapter_downloader
+from .constants import ImpVar
+from .image_downloader import chapter_downloader, chapter_stream_downloader
 from .errors import MDownloaderError, NotLoggedInError
 from .jsonmaker import BulkJson, TitleJson
-from .model import MDownloader
+from .model import ChapterJob, ChapterTable, MDownloader
 
 
-def download_chapters(md_model: MDownloader, chapters: list, chapters_data: list) -> None:
-    """Loop chapters and call the baseDownloader function.
+def download_chapters(md_model: MDownloader, chapters: list, chapters_data: set) -> None:
+    """Make a job for each chapter not downloaded and hand them to the chapter scheduler.
 
     Args:
         md_model (MDownloader): The base class this program runs on.
         chapters (list): The chapters to download.
-        chapters_data (list): The ids of the downloaded chapters from the data json.
+        chapters_data (set): The ids of the downloaded chapters from the data json.
     """
+    chapter_downloader(md_model, make_jobs(md_model, chapters, chapters_data))
+
+
+def make_jobs(md_model: MDownloader, chapters: list, chapters_data: set) -> list:
+    """Make a job for each chapter not downloaded and get the data of their groups.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        chapters (list): The chapters to download.
+        chapters_data (set): The ids of the downloaded chapters from the data json.
+
+    Returns:
+        list: The jobs of the chapters to download.
+    """
+    jobs = []
+
     for chapter in chapters:
         chapter_id = chapter["data"]["id"]
-        md_model.chapter_id = chapter_id
-        md_model.chapter_data = chapter
 
-        if md_model.args.download_in_order and md_model.type_id in (2, 3):
-            manga_data = md_model.misc.check_manga_data(chapter)
-            md_model.formatter.format_title(manga_data)
+        if chapter_id in chapters_data or md_model.exist.check_ledger(chapter):
+            continue
+
+        try:
+            if md_model.args.download_in_order and md_model.type_id in (2, 3):
+                manga_data = md_model.misc.check_manga_data(chapter)
+                md_model.formatter.format_title(manga_data)
+        except MDownloaderError as e:
+            if e: print(e)
+            continue
+
+        jobs.append(ChapterJob(md_model, chapter))
+
+    resolve_groups(md_model, [job.chapter_data for job in jobs])
+    return jobs
+
+
+def resolve_groups(md_model: MDownloader, chapters: list) -> None:
+    """Get the data of the chapters' groups that aren't in the chapter data or the cache, 100 at a time.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        chapters (list): The chapters about to be downloaded.
+    """
+    group_ids = []
+
+    for chapter in chapters:
+        for group in chapter["relationships"]:
+            if group["type"] != 'scanlation_group' or group.get('attributes') or group["id"] in group_ids:
+                continue
+
+            cache_json = md_model.cache.load_cache(group["id"])
+            if not cache_json.get('data') or md_model.cache.check_cache_time(cache_json):
+                group_ids.append(group["id"])
+
+    if not group_ids:
+        return
+
+    if md_model.debug: print(f'Calling api for the data of {len(group_ids)} group(s).')
 
+    for i in range(0, len(group_ids), 100):
+        ids = group_ids[i:i + 100]
         try:
-            if chapter_id not in chapters_data:
-                chapter_downloader(md_model)
-                md_model.wait()
+            group_response = md_model.api.request_data(md_model.group_api_url, **{"ids[]": ids, "limit": 100})
+            data = md_model.api.convert_to_json(md_model.id, 'chapter-groups', group_response)
         except MDownloaderError as e:
+            # The exporter calls the api for each group that's still missing
             if e: print(e)
+            continue
+
+        for group_data in data.get('results', []):
+            md_model.cache.save_cache(datetime.now(), group_data["data"]["id"], group_data)
+
+
+def get_feed_parameters(md_model: MDownloader) -> dict:
+    """The parameters sent with every chapter feed request.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+
+    Returns:
+        dict: The request parameters.
+    """
+    parameters = {"includes[]": ["manga", "scanlation_group"]}
+    parameters.update(md_model.params)
+    # Let the api leave out the chapters that would be filtered out
+    parameters.update(md_model.filter.query_params())
+    return parameters
+
+
+def get_chapters_page(md_model: MDownloader, url: str, parameters: dict, offset: int, limit: int=0) -> dict:
+    """Call the api for a single page of chapters.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        url (str): Request url.
+        parameters (dict): The request parameters.
+        offset (int): Where the page starts.
+        limit (int, optional): The amount of chapters in the page. Defaults to the chapter limit.
+
+    Returns:
+        dict: The api response of the page.
+    """
+    page_parameters = dict(parameters)
+    page_parameters.update({
+        "limit": limit or md_model.chapter_limit,
+        "offset": offset
+    })
+
+    # Call the api and get the json data
+    chapters_response = md_model.api.request_data(url, 1, **page_parameters)
+    return md_model.api.convert_to_json(md_model.id, f'{md_model.download_type}-chapters', chapters_response)
 
 
 def get_chapters(md_model: MDownloader, url: str) -> list:
@@ -44,56 +147,275 @@ def get_chapters(md_model: MDownloader, url: str) -> list:
         list: A list of all the chapters by the chosen method of download.
     """
     chapters = []
+    for page in get_feed_pages(md_model, url):
+        chapters.extend(page)
+    return chapters
+
+
+def get_feed_pages(md_model: MDownloader, url: str) -> Iterator[list]:
+    """Go through each page in the api, giving back the chapters of each page as soon as it's in.
+
+    The first page gives the amount of chapters, the rest of the pages are called a few at a time.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        url (str): Request url.
+
+    Yields:
+        Iterator[list]: The chapters of each page, in order.
+    """
     limit = md_model.chapter_limit
-    offset = 0
     pages = 1
-    iteration = 1
 
-    parameters = {"includes[]": ["manga"]}
-    parameters.update(md_model.params)
+    parameters = get_feed_parameters(md_model)
+
+    data = get_chapters_page(md_model, url, parameters, 0)
+
+    if md_model.type_id == 3:
+        print('Downloading only the first page of the follows.')
+        yield data["results"]
+        print('Finished going through the pages.')
+        return
 
-    while True:
-        # Update the parameters with the new offset
-        parameters.update({
-            "limit": limit,
-            "offset": offset
-        })
+    # Finds how many pages needed to be called
+    chapters_count = md_model.misc.check_for_chapters(data)
+    if chapters_count > limit:
+        pages = math.ceil(chapters_count / limit)
 
-        # Call the api and get the json data
-        chapters_response = md_model.api.request_data(url, 1, **parameters)
-        data = md_model.api.convert_to_json(md_model.id, f'{md_model.download_type}-chapters', chapters_response)
+    if chapters_count >= 10000:
+        print('Due to api limits, a maximum of 10000 chapters can be downloaded.')
 
-        chapters.extend(data["results"])
-        offset += limit
+    print(f"{pages} page(s) to go through.")
+    yield data["results"]
+    yield from iter_remaining_pages(md_model, url, parameters, chapters_count)
+
+    print('Finished going through the pages.')
 
-        if md_model.type_id == 3:
-            print('Downloading only the first page of the follows.')
-            break
 
-        # Finds how many pages needed to be called
-        if pages == 1:
-            chapters_count = md_model.misc.check_for_chapters(data)
-            if chapters_count > limit:
-                pages = math.ceil(chapters_count / limit)
+def get_remaining_pages(md_model: MDownloader, url: str, parameters: dict, chapters_count: int) -> list:
+    """Call the pages after the first at the same time.
 
-            if chapters_count >= 10000:
-                print('Due to api limits, a maximum of 10000 chapters can be downloaded.')
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        url (str): Request url.
+        parameters (dict): The request parameters.
+        chapters_count (int): The amount of chapters the first page said there are.
 
-            print(f"{pages} page(s) to go through.")
+    Returns:
+        list: The chapters of the pages, in order.
+    """
+    chapters = []
+    for page in iter_remaining_pages(md_model, url, parameters, chapters_count):
+        chapters.extend(page)
+    return chapters
 
-        # Wait every 5 pages
-        if iteration % 5 == 0 and pages != 5:
-            md_model.wait(3)
 
-        # End the loop when all the pages have been gone through
-        # Offset 10000 is the highest you can go, any higher returns an error
-        if iteration == pages or offset == 10000 or not data["results"]:
-            break
+def iter_remaining_pages(md_model: MDownloader, url: str, parameters: dict, chapters_count: int) -> Iterator[list]:
+    """Call the pages after the first at the same time, giving back each page in order.
 
-        iteration += 1
-        md_model.wait(0)
+    Only a few pages are called ahead of the page being used, so the requests wait when the pages aren't being used.
 
-    print('Finished going through the pages.')
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        url (str): Request url.
+        parameters (dict): The request parameters.
+        chapters_count (int): The amount of chapters the first page said there are.
+
+    Yields:
+        Iterator[list]: The chapters of each page, in order.
+    """
+    limit = md_model.chapter_limit
+
+    # Offset 10000 is the highest you can go, any higher returns an error
+    offsets = iter(range(limit, min(chapters_count, 10000), limit))
+
+    # The rate limiter keeps the requests under the api limit
+    with ThreadPoolExecutor(max_workers=ImpVar.MAX_FEED_REQUESTS) as executor:
+        requests = deque(executor.submit(get_chapters_page, md_model, url, parameters, offset) for offset in islice(offsets, ImpVar.MAX_FEED_REQUESTS))
+
+        while requests:
+            data = requests.popleft().result()
+
+            offset = next(offsets, None)
+            if offset is not None:
+                requests.append(executor.submit(get_chapters_page, md_model, url, parameters, offset))
+
+            yield data["results"]
+
+
+def stream_chapters(md_model: MDownloader, url: str, download_id: str, chapters_data: list) -> None:
+    """Download the chapters while the rest of the feed is still being called.
+
+    A thread goes through the pages and makes the jobs of each page's chapters, which are downloaded as soon as they're queued.
+    The queue only holds a few pages, so the pages wait when the downloads fall behind.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        url (str): Request url.
+        download_id (str): The id to cache the chapters under.
+        chapters_data (set): The ids of the downloaded chapters from the data json.
+    """
+    job_queue = queue.Queue(maxsize=ImpVar.STREAM_QUEUE_PAGES)
+    stop = threading.Event()
+    chapters = []
+
+    def queue_jobs(item: Union[list, Exception, None]) -> bool:
+        # Stop waiting for space if the downloads have stopped
+        while not stop.is_set():
+            try:
+                job_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for page_no, page in enumerate(get_feed_pages(md_model, url), start=1):
+                chapters.extend(page)
+
+                # Save the chapters so far with the reset date, so the whole feed is called again if the download stops early
+                if page_no % ImpVar.STREAM_CACHE_PAGES == 0:
+                    md_model.cache.save_cache('', download_id, md_model.data, list(chapters))
+
+                prefetch_manga(md_model, page)
+                jobs = make_jobs(md_model, md_model.filter.filter_chapters(page), chapters_data)
+                if not queue_jobs(jobs):
+                    return
+
+            md_model.cache.save_cache(datetime.now(), download_id, md_model.data, chapters)
+            queue_jobs(None)
+        except Exception as e:
+            # Raise the error in the downloads instead of leaving them waiting
+            queue_jobs(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        chapter_stream_downloader(md_model, job_queue)
+    finally:
+        stop.set()
+
+        # Wake up the downloads if they stopped while waiting for a page, the queue isn't empty if it's full
+        try:
+            job_queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+def get_updated_since(chapters: list) -> str:
+    """Find when the newest change to the cached chapters was made.
+
+    Args:
+        chapters (list): The cached chapters.
+
+    Returns:
+        str: The latest updatedAt as used by the api, empty if it can't be found.
+    """
+    updated = [c["data"]["attributes"].get("updatedAt") or '' for c in chapters]
+    # The api doesn't take the timezone, the dates are always in UTC
+    return max(updated, default='')[:19]
+
+
+def feed_order_key(chapter: dict) -> tuple:
+    """The key the manga feed is sorted by, chapter then volume, chapters without a number last.
+
+    Args:
+        chapter (dict): The chapter data.
+
+    Returns:
+        tuple: The key to sort the chapters by, highest first.
+    """
+    attributes = chapter["data"]["attributes"]
+    return tuple(ChapterTable.sort_key(n) if n is not None else (-1, 0.0, '') for n in (attributes["chapter"], attributes["volume"]))
+
+
+def get_feed_ids(md_model: MDownloader) -> Optional[set]:
+    """Get the id of every chapter of the manga in the languages chosen with a single call.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+
+    Returns:
+        Optional[set]: The chapter ids, None if they couldn't be called.
+    """
+    try:
+        response = md_model.api.request_data(
+            f'{md_model.manga_api_url}/{md_model.manga_id}/aggregate',
+            **{"translatedLanguage[]": md_model.args.language})
+        data = md_model.api.convert_to_json(md_model.manga_id, 'manga-aggregate', response)
+    except MDownloaderError as e:
+        if e: print(e)
+        return None
+
+    chapter_ids = set()
+    for volume in data.get('volumes', {}).values():
+        for chapter in volume.get('chapters', {}).values():
+            chapter_ids.add(chapter["id"])
+            chapter_ids.update(chapter.get('others', []))
+    return chapter_ids
+
+
+def refresh_chapters(md_model: MDownloader, url: str, cached_chapters: list) -> list:
+    """Only call the chapters changed since the cache was saved and merge them into the cached chapters.
+
+    A full refresh is done if a cached chapter was removed from the manga, or if the amount of chapters doesn't match the api.
+    Feeds that fit in a single page are always called in full, as that's a single request.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        url (str): Request url.
+        cached_chapters (list): The chapters in the cache.
+
+    Returns:
+        list: The up to date chapters.
+    """
+    updated_since = get_updated_since(cached_chapters)
+
+    # A feed that fits in a single page is called in one request, less than the delta needs
+    if not updated_since or len(cached_chapters) <= md_model.chapter_limit:
+        return get_chapters(md_model, url)
+
+    parameters = get_feed_parameters(md_model)
+
+    delta_parameters = dict(parameters)
+    delta_parameters["updatedAtSince"] = updated_since
+
+    data = get_chapters_page(md_model, url, delta_parameters, 0)
+    changed_chapters = data["results"]
+    changed_chapters.extend(get_remaining_pages(md_model, url, delta_parameters, data.get('total', 0)))
+
+    changed = {c["data"]["id"]: c for c in changed_chapters}
+    cached_ids = {c["data"]["id"] for c in cached_chapters}
+
+    # Removed chapters aren't in the changed chapters, so check the cached ids are still in the manga
+    feed_ids = get_feed_ids(md_model)
+    if feed_ids is None or not cached_ids <= feed_ids:
+        if md_model.debug: print('Cached chapters were removed from the manga, refreshing all the chapters.')
+        return get_chapters(md_model, url)
+
+    # Put the chapters in the order the api gives them, the volume prefixes depend on the order
+    new_chapters = [c for c in changed.values() if c["data"]["id"] not in cached_ids]
+    chapters = [changed.get(c["data"]["id"], c) for c in cached_chapters] + new_chapters
+    chapters.sort(key=feed_order_key, reverse=True)
+    chapters = chapters[:10000]
+
+    if md_model.filter.query_params():
+        # The aggregate doesn't use the filters, so the total of the filtered feed is called
+        data = get_chapters_page(md_model, url, parameters, 0, limit=1)
+        feed_total = data.get('total', 0)
+    else:
+        feed_total = len(feed_ids)
+
+    # Only the first 10000 chapters of a feed can be called
+    feed_total = min(feed_total, 10000)
+
+    if len(chapters) != feed_total:
+        if md_model.debug: print(f'Cached chapters: {len(chapters)}, api chapters: {feed_total}, refreshing all the chapters.')
+        return get_chapters(md_model, url)
+
+    print(f'Updated {len(changed) - len(new_chapters)} and added {len(new_chapters)} chapter(s) since {updated_since}.')
     return chapters
 
 
@@ -103,6 +425,25 @@ def manga_download(md_model: MDownloader) -> None:
     Args:
         md_model (MDownloader): The base class this program runs on.
     """
+    title, download_type, jobs = get_manga_jobs(md_model)
+    title_json = md_model.title_json
+
+    chapter_downloader(md_model, jobs)
+    md_model.misc.download_message(1, download_type, title)
+
+    # Save the json and covers if selected
+    title_json.core(1)
+
+
+def get_manga_jobs(md_model: MDownloader) -> Tuple[str, str, list]:
+    """Get the manga's data and chapters, and make the jobs of the chapters to download.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+
+    Returns:
+        Tuple[str, str, list]: The manga's title, the type of download and the jobs of the chapters.
+    """
     manga_id = md_model.manga_id
     download_type = md_model.download_type
 
@@ -118,7 +459,6 @@ def manga_download(md_model: MDownloader) -> None:
     if refresh_cache or not manga_data or not relationships:
         manga_data = md_model.api.get_manga_data(download_type)
         md_model.cache.save_cache(datetime.now(), manga_id, data=manga_data)
-        md_model.wait()        
 
     md_model.manga_data = manga_data
     title = md_model.formatter.format_title(manga_data)
@@ -130,13 +470,16 @@ def manga_download(md_model: MDownloader) -> None:
         chapters_data = title_json.downloaded_ids
         chapters = cache_json.get("chapters", [])
 
-        if not chapters:
+        if refresh_cache or not chapters:
             # Call the api and filter out languages other than the selected
             md_model.params = {"translatedLanguage[]": md_model.args.language, "order[chapter]": "desc", "order[volume]": "desc"}
             url = f'{md_model.manga_api_url}/{md_model.id}'
-            chapters = get_chapters(md_model, url)
+
+            if chapters and not md_model.force_refresh:
+                chapters = refresh_chapters(md_model, url, chapters)
+            else:
+                chapters = get_chapters(md_model, url)
             md_model.cache.save_cache(datetime.now(), manga_id, data=manga_data, chapters=chapters)
-            md_model.wait()
 
         md_model.chapters_data = chapters
         md_model.chapter_prefix_dict = md_model.title_misc.get_prefixes(chapters)
@@ -148,14 +491,57 @@ def manga_download(md_model: MDownloader) -> None:
     chapters = md_model.filter.filter_chapters(chapters)
     md_model.misc.download_message(0, download_type, title)
 
-    if md_model.args.range_download and md_model.type_id == 1:
+    # A range given with --chapters is used for every manga, including the ones in bulk downloads
+    range_chapters = md_model.args.range_download and md_model.type_id == 1
+    if range_chapters or (md_model.args.range_expression and (md_model.type_id == 1 or md_model.manga_download)):
         chapters = md_model.title_misc.download_range_chapters(chapters)
 
-    download_chapters(md_model, chapters, chapters_data)
-    md_model.misc.download_message(1, download_type, title)
+    return title, download_type, make_jobs(md_model, chapters, chapters_data)
 
-    # Save the json and covers if selected
-    title_json.core(1)
+
+def prefetch_manga(md_model: MDownloader, chapters: list) -> None:
+    """Get the data of the chapters' manga that aren't in the cache, 100 at a time.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        chapters (list): The chapters of the bulk download.
+    """
+    manga_ids = []
+
+    for chapter in chapters:
+        for manga in chapter["relationships"]:
+            if manga["type"] != 'manga' or manga["id"] in manga_ids:
+                continue
+
+            cache_json = md_model.cache.load_cache(manga["id"])
+            manga_data = cache_json.get('data', {})
+            if not manga_data or not manga_data.get('relationships') or md_model.cache.check_cache_time(cache_json):
+                manga_ids.append(manga["id"])
+
+    if not manga_ids:
+        return
+
+    print(f'Getting the data of {len(manga_ids)} manga.')
+
+    for i in range(0, len(manga_ids), 100):
+        ids = manga_ids[i:i + 100]
+        parameters = {
+            "ids[]": ids,
+            "limit": 100,
+            "includes[]": ["artist", "author", "cover"],
+            "contentRating[]": ["safe", "suggestive", "erotica", "pornographic"]
+        }
+
+        try:
+            manga_response = md_model.api.request_data(md_model.manga_api_url, **parameters)
+            data = md_model.api.convert_to_json(md_model.id, f'{md_model.download_type}-manga', manga_response)
+        except MDownloaderError as e:
+            # Each manga missing from the cache is called on its own when downloading
+            if e: print(e)
+            continue
+
+        for manga_data in data.get('results', []):
+            md_model.cache.save_cache(datetime.now(), manga_data["data"]["id"], data=manga_data)
 
 
 def bulk_download(md_model: MDownloader) -> None:
@@ -177,7 +563,10 @@ def bulk_download(md_model: MDownloader) -> None:
             data = md_model.api.convert_to_json(md_model.id, download_type, response)
 
             md_model.cache.save_cache(datetime.now(), download_id=md_model.id, data=data)
-            md_model.wait()
+
+        # The cached chapters are out of date, or only part of the feed if a streamed download stopped early
+        if refresh_cache:
+            cache_json = {}
 
         # Order the chapters descending by the order they're released to read
         md_model.params.update({"order[createdAt]": "desc"})
@@ -209,10 +598,25 @@ def bulk_download(md_model: MDownloader) -> None:
     md_model.misc.download_message(0, download_type, md_model.name)
     chapters = cache_json.get('chapters', [])
 
+    if md_model.args.range_expression and md_model.args.download_in_order:
+        print('The chapter range is not used when downloading in order, as the chapters of different manga are mixed together.')
+
+    # Download the chapters in order as the pages come in rather than waiting for the whole feed
+    if not chapters and md_model.args.download_in_order and md_model.type_id != 3:
+        bulk_json = BulkJson(md_model)
+        md_model.bulk_json = bulk_json
+
+        stream_chapters(md_model, url, download_id, bulk_json.downloaded_ids)
+        md_model.misc.download_message(1, download_type, md_model.name)
+
+        bulk_json.core(1)
+        return
+
     if not chapters:
         chapters = get_chapters(md_model, url)
         md_model.cache.save_cache(datetime.now(), download_id, md_model.data, chapters)
-        md_model.wait()
+
+    prefetch_manga(md_model, chapters)
 
     # Initalise json classes and make series folders
     bulk_json = BulkJson(md_model)
@@ -233,15 +637,26 @@ def bulk_download(md_model: MDownloader) -> None:
 
         print("Finished getting each manga's data, downloading the chapters.")
 
+        jobs = []
+        title_jsons = []
+        md_model.manga_download = True
+
         for title in titles:
-            md_model.manga_download = True
             md_model.manga_id = titles[title]["mangaId"]
 
-            manga_download(md_model)
-
-            md_model.manga_download = False
+            # Each job keeps its manga's title, folder and json, so the manga can share the scheduler
+            jobs.extend(get_manga_jobs(md_model)[2])
+            title_jsons.append(md_model.title_json)
             md_model.manga_data = {}
-            md_model.wait(0)
+
+        # Manga with only a few chapters download at the same time instead of one after another
+        chapter_downloader(md_model, jobs)
+
+        # Save the json and covers of each manga
+        for title_json in title_jsons:
+            title_json.core(1)
+
+        md_model.manga_download = False
     else:
         chapters_data = bulk_json.downloaded_ids
         chapters = md_model.filter.filter_chapters(chapters)
@@ -265,7 +680,6 @@ def follows_download(md_model: MDownloader) -> None:
     download_type = md_model.download_type
     response = md_model.api.request_data(f'{md_model.user_api_url}/me', **{"order[createdAt]": "desc"})
     data = md_model.api.convert_to_json('User', download_type, response)
-    md_model.wait()
 
     user_id = data["data"]["id"]
     md_model.id = user_id
@@ -303,11 +717,13 @@ def chapter_download(md_model: MDownloader) -> None:
         manga_data = md_model.misc.check_manga_data(chapter_data)
 
     md_model.formatter.format_title(manga_data)
-    md_model.chapter_data = chapter_data
     name = f'{md_model.title}: Chapter {chapter_data["data"]["attributes"]["chapter"]}'
 
     md_model.misc.download_message(0, download_type, name)
 
-    chapter_downloader(md_model)
+    if md_model.exist.check_ledger(chapter_data):
+        print('File already downloaded.')
+    else:
+        chapter_downloader(md_model, [ChapterJob(md_model, chapter_data)])
 
     md_model.misc.download_message(1, download_type, name)
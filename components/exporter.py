@@ -1,28 +1,38 @@
 #!/usr/bin/python3
+import asyncio
+import hashlib
 import json
 import os
 import re
 import shutil
+import struct
+import tempfile
+import threading
+import time
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import BinaryIO, Callable, Optional
 
+from .constants import ImpVar
 from .errors import MDownloaderError
 from .languages import get_lang_iso
-from .model import MDownloader
+from .model import ChapterJob, MDownloader
 
 
 
 class ExporterBase:
 
-    def __init__(self, md_model: MDownloader) -> None:
+    def __init__(self, md_model: MDownloader, job: ChapterJob) -> None:
         self.md_model = md_model
-        self.series_title = md_model.title
-        self.orig_chapter_data = md_model.chapter_data
-        self.chapter_id = md_model.chapter_data["data"]["id"]
-        self.chapter_data = md_model.chapter_data["data"]["attributes"]
-        self.relationships = md_model.chapter_data["relationships"]
-        self.chapter_prefix = md_model.prefix
+        self.series_title = job.title
+        self.orig_chapter_data = job.chapter_data
+        self.chapter_id = job.chapter_id
+        self.chapter_data = job.chapter_data["data"]["attributes"]
+        self.relationships = job.chapter_data["relationships"]
+        self.chapter_prefix = job.prefix
         self.oneshot = self.check_oneshot()
         self.groups = self.group_names()
         self.chapter_number = self.format_chapter_number()
@@ -33,10 +43,14 @@ class ExporterBase:
         self.folder_name = self.folder_name()
 
         self.add_data = md_model.args.save_chapter_data
-        self.destination = md_model.route
-        self.path = Path(md_model.route)
+        self.destination = job.route
+        self.path = Path(job.route)
         self.path.mkdir(parents=True, exist_ok=True)
 
+        self.lock = threading.Lock()
+        self.manifest = set()
+        self.image_count = 0
+
     def check_oneshot(self) -> int:
         """If the chapter is a oneshot.
 
@@ -200,16 +214,174 @@ class ExporterBase:
         """
         return f'{self.prefix} - p{page_no:0>3} {self.suffix}.{ext}'
 
+    def load_manifest(self, entries: list) -> None:
+        """Keep track of the files already in the archive/folder so they don't need to be listed again.
+
+        Args:
+            entries (list): The names of the files in the archive/folder.
+        """
+        self.manifest = set(entries)
+        self.image_count = len([e for e in self.manifest if e.endswith(ImpVar.IMAGE_EXTENSIONS)])
+
+    def add_to_manifest(self, entry: str) -> None:
+        """Add a newly written file to the manifest.
+
+        Args:
+            entry (str): The name of the file written.
+        """
+        if entry not in self.manifest:
+            self.manifest.add(entry)
+            if entry.endswith(ImpVar.IMAGE_EXTENSIONS):
+                self.image_count += 1
+
+    def has_page(self, page_no: int, ext: str) -> bool:
+        """Check if the page has already been written.
+
+        Args:
+            page_no (int): The image number.
+            ext (str): The image extension.
+
+        Returns:
+            bool: True if the page is in the archive/folder, False if not.
+        """
+        return self.format_page_name(page_no, ext) in self.manifest
+
+    def load_parts(self) -> Optional[dict]:
+        """Load the pages recorded as fully written by an earlier download of this chapter.
+
+        Returns:
+            Optional[dict]: The recorded pages by name, None if there is no record.
+        """
+        parts = {}
+
+        try:
+            with open(self.parts_path(), 'r', encoding='utf8') as parts_file:
+                for line in parts_file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line is cut off if the download was killed while writing it
+                        continue
+
+                    if record.get("hash") == self.chapter_data["hash"]:
+                        parts[record["page"]] = record
+        except FileNotFoundError:
+            return None
+
+        return parts
+
+    def record_page(self, page: 'ExporterPage') -> None:
+        """Record the written page so a later download can tell it's complete.
+
+        Args:
+            page (ExporterPage): The written page.
+        """
+        record = {"page": page.page_name, "size": page.size, "sha1": page.sha1.hexdigest(), "hash": self.chapter_data["hash"]}
+
+        with open(self.parts_path(), 'a', encoding='utf8') as parts_file:
+            parts_file.write(f'{json.dumps(record)}\n')
+
+    def remove_parts(self) -> None:
+        """Remove the page record once the chapter is complete."""
+        try:
+            os.remove(self.parts_path())
+        except FileNotFoundError:
+            pass
+
+    def add_image(self, response: bytes, page_no: int, ext: str) -> None:
+        """Add an image that is already in memory.
+
+        Args:
+            response (bytes): The image data.
+            page_no (int): The image number.
+            ext (str): The image extension.
+        """
+        page = self.open_page(page_no, ext)
+        page.write(response)
+        page.commit()
+
+
+
+class ExporterPage:
+
+    def __init__(self, exporter: ExporterBase, page_name: str) -> None:
+        self.exporter = exporter
+        self.page_name = page_name
+        self.size = 0
+        self.sha1 = hashlib.sha1()
+        self.spool = tempfile.SpooledTemporaryFile(max_size=ImpVar.PAGE_SPOOL_SIZE)
+
+    def write(self, chunk: bytes) -> None:
+        """Add the downloaded chunk to the page.
+
+        Args:
+            chunk (bytes): Part of the image data.
+        """
+        self.spool.write(chunk)
+        self.sha1.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> None:
+        """Write the finished page to the archive or folder."""
+        self.spool.seek(0)
+        self.exporter.check_image(self)
+        self.spool.close()
+
+    def discard(self) -> None:
+        """Throw away the unfinished page."""
+        self.spool.close()
+
+
+
+class ExportWriter:
+
+    def __init__(self) -> None:
+        self.pool = ThreadPoolExecutor(max_workers=ImpVar.WRITER_THREADS, thread_name_prefix='mdownloader-writer')
+        self.slots = asyncio.Semaphore(ImpVar.WRITER_QUEUE_SIZE)
+
+    async def submit(self, write: Callable, *args) -> None:
+        """Hand the write to the writer threads, waits if too many writes are queued.
+
+        Args:
+            write (Callable): The function doing the write.
+        """
+        async with self.slots:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self.pool, write, *args)
+
+    def close(self) -> None:
+        """Wait for the queued writes to finish and stop the writer threads."""
+        self.pool.shutdown(wait=True)
+
 
 
 class ArchiveExporter(ExporterBase):
-    def __init__(self, md_model: MDownloader) -> None:
-        super().__init__(md_model)
+    def __init__(self, md_model: MDownloader, job: ChapterJob) -> None:
+        super().__init__(md_model, job)
 
         self.archive_extension = md_model.args.archive_extension
+        self.stored_extensions = ('.jpg', '.jpeg', '.png', '.gif')
         self.archive_path = os.path.join(self.destination, f'{self.folder_name}.{self.archive_extension}')
         self.archive = self.check_zip()
- 
+        self.check_pages()
+        self.load_manifest(self.archive.namelist())
+
+    def export_path(self) -> str:
+        """Where the chapter is saved.
+
+        Returns:
+            str: The path of the archive.
+        """
+        return self.archive_path
+
+    def parts_path(self) -> str:
+        """The path of the record of the pages written to the archive.
+
+        Returns:
+            str: The path of the page record.
+        """
+        return f'{self.archive_path}.parts'
+
     def make_zip(self) -> zipfile.ZipFile:
         """Make a zipfile, if it exists, open it instead.
 
@@ -221,12 +393,123 @@ class ArchiveExporter(ExporterBase):
             zipfile.ZipFile: A ZipFile object of the open archive.
         """
         try:
+            # A killed download leaves the archive without its central directory, keep the complete pages
+            if os.path.exists(self.archive_path) and os.path.getsize(self.archive_path) > 0 and not zipfile.is_zipfile(self.archive_path):
+                print('The archive is incomplete, recovering the downloaded pages...')
+                self.rebuild_zip(self.load_parts())
+
             return zipfile.ZipFile(self.archive_path, mode="a", compression=zipfile.ZIP_DEFLATED) 
         except zipfile.BadZipFile:
             raise MDownloaderError('Error creating archive')
         except PermissionError:
             raise MDownloaderError("The file is open by another process.")
 
+    def valid_entry(self, name: str, data: bytes, parts: Optional[dict]) -> bool:
+        """Check the archive entry matches the size and hash recorded when it was written.
+
+        Args:
+            name (str): The name of the entry.
+            data (bytes): The entry's data.
+            parts (Optional[dict]): The recorded pages, None if there is no record.
+
+        Returns:
+            bool: If the entry can be kept.
+        """
+        if not name.endswith(ImpVar.IMAGE_EXTENSIONS):
+            return True
+
+        # An image cut off before any of it was written leaves an empty entry, even without a record
+        if not data:
+            return False
+
+        if parts is None:
+            return True
+
+        record = parts.get(name)
+        if record is None or record["size"] != len(data):
+            return False
+        return record["sha1"] == hashlib.sha1(data).hexdigest()
+
+    def rebuild_zip(self, parts: Optional[dict]) -> None:
+        """Make a new archive from the complete entries of the old one.
+
+        The entries are read from their local headers, so this works even if the central directory is missing.
+
+        Args:
+            parts (Optional[dict]): The recorded pages, None if there is no record.
+        """
+        header_format = '<4sHHHHHLLLHH'
+        header_size = struct.calcsize(header_format)
+        rebuild_path = f'{self.archive_path}.rebuild'
+
+        with open(self.archive_path, 'rb') as old_zip, zipfile.ZipFile(rebuild_path, mode='w') as new_zip:
+            while True:
+                header = old_zip.read(header_size)
+                if len(header) < header_size:
+                    break
+
+                signature, _, flags, method, mod_time, mod_date, crc, compressed_size, size, name_length, extra_length = struct.unpack(header_format, header)
+
+                # Stop at the central directory or if the sizes aren't in the local header
+                if signature != b'PK\x03\x04' or (flags & 0x08 and compressed_size == 0) or 0xFFFFFFFF in (compressed_size, size):
+                    break
+
+                name = old_zip.read(name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+                old_zip.read(extra_length)
+                compressed_data = old_zip.read(compressed_size)
+                if len(compressed_data) < compressed_size:
+                    break
+
+                try:
+                    if method == zipfile.ZIP_STORED:
+                        data = compressed_data
+                    elif method == zipfile.ZIP_DEFLATED:
+                        data = zlib.decompress(compressed_data, -15)
+                    else:
+                        continue
+                except zlib.error:
+                    continue
+
+                if zlib.crc32(data) != crc or name in new_zip.namelist() or not self.valid_entry(name, data, parts):
+                    continue
+
+                date_time = (((mod_date >> 9) & 0x7F) + 1980, (mod_date >> 5) & 0x0F, mod_date & 0x1F, mod_time >> 11, (mod_time >> 5) & 0x3F, (mod_time & 0x1F) * 2)
+                zip_info = zipfile.ZipInfo(name, date_time=date_time)
+                zip_info.external_attr = 0o600 << 16
+                zip_info.compress_type = method
+                new_zip.writestr(zip_info, data)
+
+        os.replace(rebuild_path, self.archive_path)
+
+    def check_pages(self) -> None:
+        """Remove the pages that don't match the record of pages written."""
+        parts = self.load_parts()
+        if parts is None:
+            return
+
+        invalid = False
+        for entry in self.archive.infolist():
+            if not entry.filename.endswith(ImpVar.IMAGE_EXTENSIONS):
+                continue
+
+            try:
+                data = self.archive.read(entry)
+            except (zipfile.BadZipFile, zlib.error, EOFError):
+                invalid = True
+                break
+
+            if not self.valid_entry(entry.filename, data, parts):
+                invalid = True
+                break
+
+        if invalid:
+            print('Some of the downloaded pages are incomplete, downloading them again...')
+            comment = self.archive.comment
+            self.archive.close()
+            self.rebuild_zip(parts)
+            self.archive = self.make_zip()
+            self.archive.comment = comment
+
     def check_zip(self) -> zipfile.ZipFile:
         """Check the zipfile to see if it is a duplicate or not.
 
@@ -265,27 +548,58 @@ class ArchiveExporter(ExporterBase):
             self.archive.comment = to_add.encode()
             return self.archive
 
-    def compress_image(self) -> None:
-        """Add image to archive through the memory."""
-        self.archive.writestr(self.page_name, self.response)
+    def entry_info(self, page_name: str) -> zipfile.ZipInfo:
+        """Make the archive entry, images that are already compressed are stored instead of deflated.
 
-    def check_image(self) -> None:
-        """Check if the image is in the archive, skip if it is."""
-        if self.page_name not in self.archive.namelist():
-            self.compress_image()
+        Args:
+            page_name (str): The name of the image in the archive.
 
-    def add_image(self, response: bytes, page_no: int, ext: str) -> None:
-        """Format the image name then add to archive.
+        Returns:
+            zipfile.ZipInfo: The archive entry to write the image to.
+        """
+        zip_info = zipfile.ZipInfo(page_name, date_time=time.localtime(time.time())[:6])
+        zip_info.external_attr = 0o600 << 16
+
+        if page_name.lower().endswith(self.stored_extensions):
+            zip_info.compress_type = zipfile.ZIP_STORED
+        else:
+            zip_info.compress_type = zipfile.ZIP_DEFLATED
+
+        return zip_info
+
+    def compress_image(self, page_name: str, image: BinaryIO) -> None:
+        """Stream the image into the archive in chunks.
+
+        Args:
+            page_name (str): The name of the image in the archive.
+            image (BinaryIO): The image data.
+        """
+        with self.archive.open(self.entry_info(page_name), 'w') as entry:
+            shutil.copyfileobj(image, entry, ImpVar.IMAGE_CHUNK_SIZE)
+
+    def check_image(self, page: ExporterPage) -> None:
+        """Check if the image is in the archive, skip if it is.
+
+        Args:
+            page (ExporterPage): The downloaded page.
+        """
+        with self.lock:
+            if page.page_name not in self.manifest:
+                self.compress_image(page.page_name, page.spool)
+                self.add_to_manifest(page.page_name)
+                self.record_page(page)
+
+    def open_page(self, page_no: int, ext: str) -> ExporterPage:
+        """Start a page that the image can be written to as it downloads.
 
         Args:
-            response (bytes): The image data.
             page_no (int): The image number.
             ext (str): The image extension.
-        """
-        self.page_name = self.format_page_name(page_no, ext)
-        self.response = response
 
-        self.check_image()
+        Returns:
+            ExporterPage: The page to write the image data to.
+        """
+        return ExporterPage(self, self.format_page_name(page_no, ext))
 
     def close(self, status: bool=0) -> None:
         """Close the archive and save the chapter data.
@@ -293,21 +607,23 @@ class ArchiveExporter(ExporterBase):
         Args:
             status (bool, optional): The type of archive closing. Defaults to 0.
         """
-        if not status:
-            # Add the chapter data json to the archive
-            if self.add_data and f'{self.chapter_id}.json' not in self.archive.namelist():
-                self.archive.writestr(f'{self.chapter_id}.json', json.dumps(self.orig_chapter_data, indent=4, ensure_ascii=False))
+        with self.lock:
+            if not status:
+                # Add the chapter data json to the archive
+                if self.add_data and f'{self.chapter_id}.json' not in self.manifest:
+                    self.archive.writestr(f'{self.chapter_id}.json', json.dumps(self.orig_chapter_data, indent=4, ensure_ascii=False))
 
-        self.archive.close()
+            self.archive.close()
 
         if status:
             os.remove(self.archive_path)
+            self.remove_parts()
 
 
 
 class FolderExporter(ExporterBase):
-    def __init__(self, md_model: MDownloader) -> None:
-        super().__init__(md_model)
+    def __init__(self, md_model: MDownloader, job: ChapterJob) -> None:
+        super().__init__(md_model, job)
 
         self.check_folder()
 
@@ -333,6 +649,8 @@ class FolderExporter(ExporterBase):
         """Check if the image is in the folder, skip if it is"""
         self.folder_path = self.path.joinpath(self.folder_name)
         self.make_folder()
+        self.check_pages()
+        self.load_manifest(os.listdir(self.folder_path))
         # version_no = 1
         # if self.makeFolder():
         #     if f'{self.chapter_id}.json' not in os.listdir(self.folder_path):
@@ -348,28 +666,78 @@ class FolderExporter(ExporterBase):
         #             else:
         #                 break
 
-    def add_to_folder(self) -> None:
-        """Add images to the folder."""
-        with open(self.folder_path.joinpath(self.page_name), 'wb') as file:
-            file.write(self.response)
+    def export_path(self) -> str:
+        """Where the chapter is saved.
+
+        Returns:
+            str: The path of the folder.
+        """
+        return str(self.folder_path)
 
-    def check_image(self) -> None:
-        """Check if images are in the folder."""
-        if self.page_name not in os.listdir(self.folder_path):
-            self.add_to_folder()
+    def parts_path(self) -> Path:
+        """The path of the record of the pages written to the folder.
 
-    def add_image(self, response: bytes, page_no: int, ext: str) -> None:
-        """Format the image name then add to archive.
+        Returns:
+            Path: The path of the page record.
+        """
+        return self.folder_path.joinpath('.parts')
+
+    def check_pages(self) -> None:
+        """Remove the pages that don't match the record of pages written and any unfinished pages."""
+        parts = self.load_parts()
+
+        for file_name in os.listdir(self.folder_path):
+            file_path = self.folder_path.joinpath(file_name)
+
+            if file_name.endswith('.part'):
+                os.remove(file_path)
+                continue
+
+            if parts is None or not file_name.endswith(ImpVar.IMAGE_EXTENSIONS):
+                continue
+
+            record = parts.get(file_name)
+            if record is None or record["size"] != file_path.stat().st_size or record["sha1"] != hashlib.sha1(file_path.read_bytes()).hexdigest():
+                os.remove(file_path)
+
+    def add_to_folder(self, page_name: str, image: BinaryIO) -> None:
+        """Add images to the folder, the image is moved into place once it's fully written.
+
+        Args:
+            page_name (str): The name of the image in the folder.
+            image (BinaryIO): The image data.
+        """
+        part_path = self.folder_path.joinpath(f'{page_name}.part')
+
+        with open(part_path, 'wb') as file:
+            shutil.copyfileobj(image, file, ImpVar.IMAGE_CHUNK_SIZE)
+
+        os.replace(part_path, self.folder_path.joinpath(page_name))
+
+    def check_image(self, page: ExporterPage) -> None:
+        """Check if images are in the folder.
+
+        Args:
+            page (ExporterPage): The downloaded page.
+        """
+        if page.page_name not in self.manifest:
+            self.add_to_folder(page.page_name, page.spool)
+
+            with self.lock:
+                self.add_to_manifest(page.page_name)
+                self.record_page(page)
+
+    def open_page(self, page_no: int, ext: str) -> ExporterPage:
+        """Start a page that the image can be written to as it downloads.
 
         Args:
-            response (bytes): The image data.
             page_no (int): The image number.
             ext (str): The image extension.
-        """
-        self.page_name = self.format_page_name(page_no, ext)
-        self.response = response
 
-        self.check_image()
+        Returns:
+            ExporterPage: The page to write the image data to.
+        """
+        return ExporterPage(self, self.format_page_name(page_no, ext))
 
     def close(self, status: bool=0) -> None:
         """Close the archive and save the chapter data.
@@ -379,7 +747,7 @@ class FolderExporter(ExporterBase):
         """
         if not status:
             # Add the chapter data json to the folder
-            if self.add_data and f'{self.chapter_id}.json' not in os.listdir(self.folder_path):
+            if self.add_data and f'{self.chapter_id}.json' not in self.manifest:
                 with open(self.folder_path.joinpath(f'{self.chapter_id}.json'), 'w') as json_file:
                     json.dump(self.orig_chapter_data, json_file, indent=4, ensure_ascii=False)
         else:
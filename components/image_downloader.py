@@ -1,16 +1,36 @@
 #!/usr/bin/python3
 import asyncio
+import queue
 import time
 from datetime import datetime
-from typing import Type, Union
+from typing import Awaitable, Callable
 
-from aiohttp import ClientSession, ClientError
+from aiohttp import ClientSession, ClientError, TCPConnector
 from tqdm import tqdm
 
 from .constants import ImpVar
-from .exporter import ArchiveExporter, FolderExporter
+from .errors import MDownloaderError
+from .exporter import ArchiveExporter, ExporterPage, ExportWriter, FolderExporter
 from .mangaplus import MangaPlus
-from .model import MDownloader
+from .model import ChapterJob, MDownloader
+from .reporter import ImageReporter
+
+
+def get_reporter(md_model: MDownloader) -> ImageReporter:
+    """Get the run's image reporter, make it if it doesn't exist.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+
+    Returns:
+        ImageReporter: The reporter that sends the image reports in the background.
+    """
+    session = get_session(md_model)
+
+    if md_model.image_reporter is None or md_model.image_reporter.session is not session:
+        md_model.image_reporter = ImageReporter(md_model, session)
+
+    return md_model.image_reporter
 
 
 def report_image(
@@ -19,7 +39,7 @@ def report_image(
         image_link: str,
         img_size: int,
         start_time: int) -> None:
-    """Report the success of the image.
+    """Queue the report of the image's success, the report is sent in the background.
 
     Args:
         md_model (MDownloader): The base class this program runs on.
@@ -28,35 +48,96 @@ def report_image(
         img_size (int): The size in bytes of the image.
         start_time (int): When the request was started.
     """
-    end_time = time.time()
-    elapsed_time = int((end_time - start_time) * 1000)
+    get_reporter(md_model).report(success, image_link, img_size, start_time)
+
+
+async def flush_reports(md_model: MDownloader) -> None:
+    """Wait for the queued image reports to be sent.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+    """
+    if md_model.image_reporter is not None:
+        await md_model.image_reporter.flush()
+
 
-    data = {
-        "url": image_link,
-        "success": success,
-        "bytes": img_size,
-        "duration": elapsed_time
-    }
+def get_session(md_model: MDownloader) -> ClientSession:
+    """Get the session shared by all the image downloads in the run, make it if it doesn't exist.
 
-    response = md_model.api.post_data(md_model.report_url, data)
+    Args:
+        md_model (MDownloader): The base class this program runs on.
 
-    if md_model.debug: print(f'Reporting image {str(success)}.')
+    Returns:
+        ClientSession: The pooled session to download images with.
+    """
+    if md_model.image_session is None or md_model.image_session.closed:
+        connector = TCPConnector(
+            limit=ImpVar.CONNECTION_LIMIT,
+            limit_per_host=ImpVar.CONNECTION_LIMIT_PER_HOST,
+            ttl_dns_cache=ImpVar.DNS_CACHE_TIME,
+            keepalive_timeout=ImpVar.KEEPALIVE_TIMEOUT)
+        md_model.image_session = ClientSession(connector=connector)
 
-    # data = md_model.api.convertJson(md_mode.chapter_id, 'image-report', response)
+    return md_model.image_session
 
 
-def get_server(md_model: MDownloader) -> str:
-    """Get the MD@H node to download images from.
+def close_session(md_model: MDownloader) -> None:
+    """Close the shared image session at the end of the run.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+    """
+    if md_model.image_session is not None and not md_model.image_session.closed:
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(flush_reports(md_model))
+        loop.run_until_complete(md_model.image_session.close())
+
+    if md_model.api.async_session is not None:
+        asyncio.get_event_loop().run_until_complete(md_model.api.close_async_session())
+
+    md_model.image_session = None
+    md_model.image_reporter = None
+
+
+def get_writer(md_model: MDownloader) -> ExportWriter:
+    """Get the writer threads shared by all the exporters in the run, make them if they don't exist.
 
     Args:
         md_model (MDownloader): The base class this program runs on.
 
+    Returns:
+        ExportWriter: The writer to hand the finished pages to.
+    """
+    if md_model.export_writer is None:
+        md_model.export_writer = ExportWriter()
+
+    return md_model.export_writer
+
+
+def close_writer(md_model: MDownloader) -> None:
+    """Wait for the queued writes and stop the writer threads at the end of the run.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+    """
+    if md_model.export_writer is not None:
+        md_model.export_writer.close()
+
+    md_model.export_writer = None
+
+
+async def lease_server(md_model: MDownloader, chapter_id: str, failed_server: str='') -> str:
+    """Get the chapter's leased MD@H node without blocking the downloads, a new one is only leased if needed.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        chapter_id (str): The id of the chapter to download.
+        failed_server (str, optional): The node that failed to download. Defaults to ''.
+
     Returns:
         str: The MD@H node to download images from.
     """
-    server_response = md_model.api.request_data(f'{md_model.mdh_url}/{md_model.chapter_id}')
-    server_data = md_model.api.convert_to_json(md_model.chapter_id, 'chapter-server', server_response)
-    return server_data["baseUrl"]
+    return await md_model.leases.get_server(chapter_id, failed_server)
 
 
 async def display_progress(tasks: list) -> None:
@@ -73,138 +154,388 @@ async def display_progress(tasks: list) -> None:
 
 async def image_download(
         md_model: MDownloader,
-        url: str,
-        fallback_url: str,
+        job: ChapterJob,
         image: str,
-        pages: list,
-        exporter: Type[Union[ArchiveExporter, FolderExporter]]) -> None:
+        page_no: int,
+        image_semaphore: asyncio.Semaphore) -> None:
     """Download the MangaDex chapter images.
 
     Args:
         md_model (MDownloader): The base class this program runs on.
-        url (str): The server to download images from.
-        fallback_url (str): A backup server to download images from.
+        job (ChapterJob): The chapter being downloaded.
         image (str): The image name.
-        pages (list): List of all the images.
-        exporter (Type[Union[ArchiveExporter, FolderExporter]]): Add images to the exporter.
+        page_no (int): The image number.
+        image_semaphore (asyncio.Semaphore): Limits the images downloading at the same time across all the chapters.
     """
-    retry = 0
-    fallback_retry = 0
-    retry_max_times = ImpVar.RETRY_MAX_TIMES
-    time_to_sleep = ImpVar.TIME_TO_SLEEP
-    image_link = url + image
+    async with image_semaphore:
+        await fetch_image(md_model, job, image, page_no, image_semaphore)
 
-    # Try to download it retry_max_times times
-    while retry < retry_max_times:
-        start_time = time.time()
-        async with ClientSession() as session:
+
+async def stream_image(
+        md_model: MDownloader,
+        job: ChapterJob,
+        image_link: str,
+        page_no: int,
+        started: asyncio.Event) -> ExporterPage:
+    """Download the image into a page of the exporter.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        job (ChapterJob): The chapter being downloaded.
+        image_link (str): The url of the image.
+        page_no (int): The image number.
+        started (asyncio.Event): Set once the server starts responding.
+
+    Returns:
+        ExporterPage: The downloaded page, ready to be written.
+    """
+    session = get_session(md_model)
+    start_time = time.time()
+
+    try:
+        async with session.get(image_link) as response:
+
+            assert response.status == 200
+
+            started.set()
+            md_model.latency.add(time.time() - start_time)
+            extension = image_link.rsplit('.', 1)[1]
+
+            # Write the image to the exporter as it downloads
+            page = job.exporter.open_page(page_no, extension)
             try:
-                async with session.get(image_link) as response:
+                async for chunk in response.content.iter_chunked(ImpVar.IMAGE_CHUNK_SIZE):
+                    page.write(chunk)
+            except BaseException:
+                page.discard()
+                raise
+
+    except (ClientError, AssertionError, ConnectionResetError, asyncio.TimeoutError):
+        report_image(md_model, False, image_link, 0, start_time)
+        raise
+
+    report_image(md_model, True, image_link, page.size, start_time)
+    return page
+
+
+async def hedged_download(
+        md_model: MDownloader,
+        job: ChapterJob,
+        image: str,
+        page_no: int,
+        server: str,
+        image_semaphore: asyncio.Semaphore) -> ExporterPage:
+    """Download the image, if it doesn't start within the usual time, send a duplicate request to the fallback server.
 
-                    assert response.status == 200
-                    img_data = await response.read()
+    The hedged request takes its own image slot, it isn't sent if they're all in use or the fallback is the same server.
 
-                    report_image(md_model, True, image_link, len(img_data), start_time)
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        job (ChapterJob): The chapter being downloaded.
+        image (str): The image name.
+        page_no (int): The image number.
+        server (str): The MD@H node to download the image from.
+        image_semaphore (asyncio.Semaphore): Limits the images downloading at the same time across all the chapters.
 
-                    page_no = pages.index(image) + 1
-                    extension = image.split('.', 1)[1]
+    Returns:
+        ExporterPage: The page of the request that finished first.
+    """
+    chapter_hash = job.chapter_data["data"]["attributes"]["hash"]
+    started = asyncio.Event()
+    primary = asyncio.ensure_future(stream_image(md_model, job, f'{server}/data/{chapter_hash}/{image}', page_no, started))
+    hedge_delay = md_model.latency.hedge_delay()
 
-                    # Add image to archive
-                    exporter.add_image(img_data, page_no, extension)
+    if hedge_delay is None:
+        return await primary
 
-                    retry = retry_max_times
+    waiter = asyncio.ensure_future(started.wait())
+    await asyncio.wait({primary, waiter}, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+    waiter.cancel()
 
-            except (ClientError, AssertionError, ConnectionResetError, asyncio.TimeoutError):
-                retry += 1
+    if started.is_set() or primary.done() or image_semaphore.locked():
+        return await primary
 
-                report_image(md_model, False, image_link, 0, start_time)
+    try:
+        fallback_server = await md_model.leases.get_fallback(job.chapter_id)
+    except MDownloaderError:
+        return await primary
 
-                if retry == retry_max_times:
+    # A hedge to the same node would only add to its load
+    if fallback_server == server or image_semaphore.locked():
+        return await primary
 
-                    if fallback_url != '' and fallback_retry == 0:
-                        retry = 0
-                        fallback_retry = 1
-                        url = fallback_url
-                        if md_model.debug: print(f'Retrying with the fallback url.')
-                    else:
-                        print(f'Could not download image {image_link} after {retry} times.')
+    await image_semaphore.acquire()
+    try:
+        if md_model.debug: print(f'Image {image} is slow, sending a hedged request.')
+        hedge_link = f'{fallback_server}/data/{chapter_hash}/{image}'
+        hedge = asyncio.ensure_future(stream_image(md_model, job, hedge_link, page_no, asyncio.Event()))
+        pending = {primary, hedge}
+        error = None
 
-                await asyncio.sleep(time_to_sleep)
+        # Take whichever request finishes first and cancel the other
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
 
+            finished = [task for task in done if task.exception() is None]
+            error = next((task.exception() for task in done if task.exception() is not None), error)
 
-def chapter_downloader(md_model: MDownloader) -> None:
-    """Use the chapter data for image downloads and file name export.
+            if finished:
+                for loser in pending:
+                    loser.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
 
-    download_type: 0 = chapter
-    download_type: 1 = manga
-    download_type: 2 = group|user|list
-    download_type: 3 = follows
+                # Both requests can finish in the same round, only one page is kept
+                for page in [task.result() for task in finished[1:]]:
+                    page.discard()
+                return finished[0].result()
+
+        raise error
+    finally:
+        image_semaphore.release()
+
+
+async def fetch_image(
+        md_model: MDownloader,
+        job: ChapterJob,
+        image: str,
+        page_no: int,
+        image_semaphore: asyncio.Semaphore) -> None:
+    """Try the leased server, then a newly leased one, until the image is downloaded.
 
     Args:
         md_model (MDownloader): The base class this program runs on.
+        job (ChapterJob): The chapter being downloaded.
+        image (str): The image name.
+        page_no (int): The image number.
+        image_semaphore (asyncio.Semaphore): Limits the images downloading at the same time across all the chapters.
     """
-    external = False
-    chapter_id = md_model.chapter_id
-    data = md_model.chapter_data
-    title = md_model.title
+    retry = 0
+    fallback_retry = 0
+    retry_max_times = ImpVar.RETRY_MAX_TIMES
+    time_to_sleep = ImpVar.TIME_TO_SLEEP
+    chapter_hash = job.chapter_data["data"]["attributes"]["hash"]
 
-    if r'https://mangaplus.shueisha.co.jp/viewer/' in data["data"]["attributes"]["data"][0]:
-        external = True
+    server = await lease_server(md_model, job.chapter_id)
+    image_link = f'{server}/data/{chapter_hash}/{image}'
 
-    # if ImpVar.MANGAPLUS_GROUP_ID in [g["id"] for g in data["relationships"] if g["type"] == 'scanlation_group']:
-    #     external = True
+    # Try to download it retry_max_times times
+    while retry < retry_max_times:
+        try:
+            page = await hedged_download(md_model, job, image, page_no, server, image_semaphore)
+            await get_writer(md_model).submit(page.commit)
+
+            retry = retry_max_times
+
+        except (ClientError, AssertionError, ConnectionResetError, asyncio.TimeoutError):
+            retry += 1
+
+            if retry == retry_max_times:
 
+                if fallback_retry == 0:
+                    # The node failed, lease a new one unless another page already has
+                    try:
+                        server = await lease_server(md_model, job.chapter_id, server)
+                    except MDownloaderError as e:
+                        print(e)
+                        break
+
+                    retry = 0
+                    fallback_retry = 1
+                    image_link = f'{server}/data/{chapter_hash}/{image}'
+                    if md_model.debug: print(f'Retrying with the fallback url.')
+                else:
+                    print(f'Could not download image {image_link} after {retry} times.')
+
+            await asyncio.sleep(time_to_sleep)
+
+
+def prepare_chapter(md_model: MDownloader, job: ChapterJob) -> bool:
+    """Make the chapter's exporter, check if it exists and get the servers to download from.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        job (ChapterJob): The chapter to download.
+
+    Raises:
+        MDownloaderError: The chapter has already been downloaded.
+
+    Returns:
+        bool: If the chapter is external and needs to be downloaded from MangaPlus.
+    """
+    data = job.chapter_data
     chapter_data = data["data"]["attributes"]
-    md_model.prefix = md_model.chapter_prefix_dict.get(chapter_data["volume"], 'c')
+    external = r'https://mangaplus.shueisha.co.jp/viewer/' in chapter_data["data"][0]
+
+    # if ImpVar.MANGAPLUS_GROUP_ID in [g["id"] for g in data["relationships"] if g["type"] == 'scanlation_group']:
+    #     external = True
 
     # Make the files
     if md_model.args.folder_download:
-        exporter = FolderExporter(md_model)
+        job.exporter = FolderExporter(md_model, job)
     else:
-        exporter = ArchiveExporter(md_model)
-
-    md_model.exporter = exporter
+        job.exporter = ArchiveExporter(md_model, job)
 
     # Add chapter data to the json for title, group or user downloads
-    data_to_add = data.copy()
-    if md_model.type_id in (1,):
-        # data_to_add.update({"mangaData": md_model.manga_data})
-        md_model.title_json.chapters(data_to_add)
-    if md_model.type_id in (2, 3):
-        md_model.bulk_json.chapters(data_to_add)
+    md_model.exist.add_chapter_json(job)
+
+    print(f'Downloading {job.title} | Volume: {chapter_data["volume"]} | Chapter: {chapter_data["chapter"]} | Title: {chapter_data["title"]}')
+
+    if external:
+        return True
+
+    # Check if the chapter has been downloaded already
+    exists = md_model.exist.check_exist(job, chapter_data["data"])
+    md_model.exist.before_download(job, exists)
+    return False
+
+
+def finish_chapter(md_model: MDownloader, job: ChapterJob, pages: list) -> None:
+    """Save the json if all the images were downloaded and close the exporter.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        job (ChapterJob): The downloaded chapter.
+        pages (list): List of all the images.
+    """
+    downloaded_all = md_model.exist.check_exist(job, pages)
+    md_model.exist.after_download(job, downloaded_all)
+
 
-    print(f'Downloading {title} | Volume: {chapter_data["volume"]} | Chapter: {chapter_data["chapter"]} | Title: {chapter_data["title"]}')
+async def chapter_worker(
+        md_model: MDownloader,
+        job: ChapterJob,
+        api_semaphore: asyncio.Semaphore,
+        image_semaphore: asyncio.Semaphore) -> None:
+    """Download a single chapter, the blocking api calls and file writes are done in a thread.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        job (ChapterJob): The chapter to download.
+        api_semaphore (asyncio.Semaphore): Limits the chapters calling the api at the same time.
+        image_semaphore (asyncio.Semaphore): Limits the images downloading at the same time.
+    """
+    loop = asyncio.get_event_loop()
+
+    async with api_semaphore:
+        external = await loop.run_in_executor(None, prepare_chapter, md_model, job)
+
+        # Lease the server the images will be downloaded from
+        if not external:
+            await lease_server(md_model, job.chapter_id)
 
     # External chapters
     if external:
         # Call MangaPlus downloader
         print('External chapter. Connecting to MangaPlus to download.')
-        MangaPlus(md_model).mplus_images()
+        await loop.run_in_executor(None, MangaPlus(md_model, job).mplus_images)
         return
 
-    pages = chapter_data["data"]
+    pages = job.chapter_data["data"]["attributes"]["data"]
+    tasks = []
 
-    # Check if the chapter has been downloaded already
-    exists = md_model.exist.check_exist(pages)
-    md_model.exist.before_download(exists)
+    # Download images
+    for page_no, image in enumerate(pages, start=1):
+        # Only download the pages missing from an earlier download
+        if job.exporter.has_page(page_no, image.split('.', 1)[1]):
+            continue
 
-    server = get_server(md_model)
-    fallback_server = get_server(md_model)
+        task = asyncio.ensure_future(image_download(md_model, job, image, page_no, image_semaphore))
+        tasks.append(task)
 
-    url = f'{server}/data/{chapter_data["hash"]}/'
-    fallback_url = f'{fallback_server}/data/{chapter_data["hash"]}/'
+    await display_progress(tasks)
+    await flush_reports(md_model)
+    md_model.leases.release(job.chapter_id)
+    await loop.run_in_executor(None, finish_chapter, md_model, job, pages)
 
-    # ASYNC FUNCTION
-    loop  = asyncio.get_event_loop()
-    tasks = []
 
-    # Download images
-    for image in pages:
-        task = asyncio.ensure_future(image_download(md_model, url, fallback_url, image, pages, exporter))
-        tasks.append(task)
+async def chapter_scheduler(md_model: MDownloader, jobs: list) -> None:
+    """Keep a number of chapters downloading at the same time.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        jobs (list): The chapters to download.
+    """
+    run_job = get_job_runner(md_model)
+    await asyncio.gather(*[run_job(job) for job in jobs])
+
+
+async def chapter_stream_scheduler(md_model: MDownloader, job_queue: queue.Queue) -> None:
+    """Download the chapters of each page as soon as they're queued, the queue ends with None.
+
+    No more pages are taken while too many chapters are waiting, so the queue fills up and holds back the pages.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        job_queue (queue.Queue): The jobs of each page, an error if the pages couldn't be called.
+    """
+    loop = asyncio.get_event_loop()
+    run_job = get_job_runner(md_model)
+    pending = set()
+
+    while True:
+        # Wait for the next page in a thread so the downloads keep going
+        jobs = await loop.run_in_executor(None, job_queue.get)
+
+        if jobs is None or isinstance(jobs, Exception):
+            break
+
+        pending.update(asyncio.ensure_future(run_job(job)) for job in jobs)
+
+        while len(pending) >= ImpVar.STREAM_BUFFER_CHAPTERS:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+    # Finish the chapters already started before raising the error
+    await asyncio.gather(*pending)
+
+    if jobs is not None:
+        raise jobs
+
+
+def get_job_runner(md_model: MDownloader) -> Callable[[ChapterJob], Awaitable[None]]:
+    """Make the function that runs a chapter job, limiting the chapters, api calls and images at the same time.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+
+    Returns:
+        Callable[[ChapterJob], Awaitable[None]]: Downloads the chapter of the job.
+    """
+    chapter_semaphore = asyncio.Semaphore(ImpVar.MAX_CHAPTER_DOWNLOADS)
+    api_semaphore = asyncio.Semaphore(ImpVar.MAX_API_CALLS)
+    image_semaphore = asyncio.Semaphore(ImpVar.MAX_IMAGE_DOWNLOADS)
+
+    async def run_job(job: ChapterJob) -> None:
+        async with chapter_semaphore:
+            try:
+                await chapter_worker(md_model, job, api_semaphore, image_semaphore)
+            except MDownloaderError as e:
+                if e: print(e)
 
-    runner = display_progress(tasks)
-    loop.run_until_complete(runner)
+    return run_job
 
-    downloaded_all = md_model.exist.check_exist(pages)
-    md_model.exist.after_download(downloaded_all)
+
+def chapter_downloader(md_model: MDownloader, jobs: list) -> None:
+    """Use the chapter data for image downloads and file name export.
+
+    download_type: 0 = chapter
+    download_type: 1 = manga
+    download_type: 2 = group|user|list
+    download_type: 3 = follows
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        jobs (list): The chapters to download.
+    """
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(chapter_scheduler(md_model, jobs))
+
+
+def chapter_stream_downloader(md_model: MDownloader, job_queue: queue.Queue) -> None:
+    """Download the chapters as the pages of the feed are queued.
+
+    Args:
+        md_model (MDownloader): The base class this program runs on.
+        job_queue (queue.Queue): The jobs of each page, ending with None.
+    """
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(chapter_stream_scheduler(md_model, job_queue))
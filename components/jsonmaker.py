@@ -3,6 +3,7 @@ from datetime import datetime
 import json
 import os
 import re
+import threading
 from pathlib import Path
 from urllib.parse import quote
 
@@ -34,20 +35,22 @@ class JsonBase:
 
         self.route.mkdir(parents=True, exist_ok=True)
         self.json_path = self.route.joinpath(f'{file_prefix}{self.id}_data').with_suffix('.json')
+        self.journal_path = self.json_path.with_suffix('.journal')
 
+        self.lock = threading.Lock()
+        self.journal_records = {}
         self.data_json = self.check_json_exist()
+        self.load_journal()
         self.new_data = {}
         self.chapter_data = self.data_json.get('chapters', [])
-        self.downloaded_ids = [c["data"]["id"] for c in self.chapter_data] if (self.chapter_data and not self.md_model.force_refresh) else []
+        self.downloaded_ids = {c["data"]["id"] for c in self.chapter_data} if (self.chapter_data and not self.md_model.force_refresh) else set()
         self.chapters_archive = [c["data"]["id"] for c in self.chapter_data if 'chapters_archive' in c and c["chapters_archive"]] if (self.chapter_data and not self.md_model.force_refresh) else []
         self.chapters_folder = [c["data"]["id"] for c in self.chapter_data if 'chapters_folder' in c and c["chapters_folder"]] if (self.chapter_data and not self.md_model.force_refresh) else []
 
         if self.md_model.args.folder_download:
-            self.downloaded_ids.extend(self.chapters_folder)
+            self.downloaded_ids.update(self.chapters_folder)
         else:
-            self.downloaded_ids.extend(self.chapters_archive)
-
-        self.downloaded_ids = list(set(self.downloaded_ids))
+            self.downloaded_ids.update(self.chapters_archive)
 
     def check_json_exist(self) -> dict:
         """Check if the json already exists.
@@ -62,6 +65,28 @@ class JsonBase:
         except (FileNotFoundError, json.JSONDecodeError):
             return {}
 
+    def load_journal(self) -> None:
+        """Add the chapters saved to the journal since the json was last saved."""
+        try:
+            with open(self.journal_path, 'r', encoding='utf8') as journal_file:
+                lines = journal_file.readlines()
+        except FileNotFoundError:
+            return
+
+        chapters = self.data_json.setdefault('chapters', [])
+        chapter_ids = {c["data"]["id"] for c in chapters}
+
+        for line in lines:
+            try:
+                chapter_data = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line can be cut off if the program was stopped while writing
+                continue
+
+            if chapter_data["data"]["id"] not in chapter_ids:
+                chapters.append(chapter_data)
+                chapter_ids.add(chapter_data["data"]["id"])
+
     def chapters(self, chapter_data: dict) -> None:
         """Add the chapter data to the json.
 
@@ -75,15 +100,35 @@ class JsonBase:
         else:
             chapter_data.update({"chapters_archive": True})
 
-        if chapter_id not in self.downloaded_ids:
-            self.chapter_data.append(chapter_data)
-            self.downloaded_ids.append(chapter_id)
+        with self.lock:
+            if chapter_id not in self.downloaded_ids:
+                self.chapter_data.append(chapter_data)
+                self.downloaded_ids.add(chapter_id)
+                self.journal_records[chapter_id] = chapter_data
+
+    def add_to_journal(self, chapter_id: str) -> None:
+        """Append the downloaded chapter to the journal instead of saving the whole json.
+
+        Args:
+            chapter_id (str): The id of the downloaded chapter.
+        """
+        with self.lock:
+            chapter_data = self.journal_records.pop(chapter_id, None)
+            if chapter_data is None:
+                return
+
+            with open(self.journal_path, 'a', encoding='utf8') as journal_file:
+                journal_file.write(json.dumps(chapter_data, ensure_ascii=False, separators=(',', ':')) + '\n')
 
     def save_json(self) -> None:
-        """Save the json."""
-        with open(self.json_path, 'w', encoding='utf8') as json_file:
+        """Save the json and clear the journal now the chapters in it are saved in the json."""
+        temp_path = self.json_path.with_suffix('.json.tmp')
+        with open(temp_path, 'w', encoding='utf8') as json_file:
             json.dump(self.new_data, json_file, indent=4, ensure_ascii=False)
 
+        os.replace(temp_path, self.json_path)
+        self.journal_path.unlink(missing_ok=True)
+
     def core(self, save_type: int=0) -> None:
         """Format the json for exporting.
 
@@ -103,9 +148,10 @@ class JsonBase:
 
         # self.new_data["chapters_archive"] = self.chapters_archive
         # self.new_data["chapters_folder"] = self.chapters_folder
-        self.new_data["chapters"] = self.chapter_data
-        # self.addChaptersJson()
-        self.save_json()
+        with self.lock:
+            self.new_data["chapters"] = self.chapter_data
+            # self.addChaptersJson()
+            self.save_json()
 
 
 
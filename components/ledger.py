@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+
+
+class DownloadLedger:
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the ledger the first time it's used, the lock needs to be held.
+
+        Returns:
+            sqlite3.Connection: The ledger database.
+        """
+        if self.connection is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # The chapter workers record their downloads from the executor threads
+            self.connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS ledger (
+                    chapter_id TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    hash TEXT NOT NULL DEFAULT '',
+                    format TEXT NOT NULL,
+                    completed TEXT NOT NULL
+                )
+            """)
+            self.connection.commit()
+        return self.connection
+
+    def get(self, chapter_id: str) -> Optional[dict]:
+        """Get the ledger entry of the chapter.
+
+        Args:
+            chapter_id (str): The id of the chapter.
+
+        Returns:
+            Optional[dict]: Where and when the chapter was downloaded, None if it hasn't been.
+        """
+        with self.lock:
+            row = self.connect().execute('SELECT path, hash, format, completed FROM ledger WHERE chapter_id = ?', (chapter_id,)).fetchone()
+
+        if row is None:
+            return None
+        return {"path": row[0], "hash": row[1], "format": row[2], "completed": row[3]}
+
+    def downloaded_path(self, chapter_data: dict, export_format: str) -> Optional[str]:
+        """Check if the same version of the chapter has been downloaded in the same format by any download.
+
+        Args:
+            chapter_data (dict): The chapter data from the api.
+            export_format (str): Either archive or folder.
+
+        Returns:
+            Optional[str]: Where the chapter was downloaded to, None if it needs downloading.
+        """
+        entry = self.get(chapter_data["data"]["id"])
+        if entry is None or entry["format"] != export_format:
+            return None
+
+        # A new hash means the chapter was re-uploaded
+        if entry["hash"] != (chapter_data["data"]["attributes"].get("hash") or ''):
+            return None
+
+        if not os.path.exists(entry["path"]):
+            return None
+        return entry["path"]
+
+    def record(self, chapter_data: dict, path: str, export_format: str) -> None:
+        """Add the downloaded chapter to the ledger.
+
+        Args:
+            chapter_data (dict): The chapter data from the api.
+            path (str): The archive or folder the chapter was downloaded to.
+            export_format (str): Either archive or folder.
+        """
+        row = (
+            chapter_data["data"]["id"],
+            os.path.abspath(path),
+            chapter_data["data"]["attributes"].get("hash") or '',
+            export_format,
+            str(datetime.now()))
+
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO ledger (chapter_id, path, hash, format, completed) VALUES (?, ?, ?, ?, ?)', row)
+
+    def close(self) -> None:
+        """Close the ledger database."""
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
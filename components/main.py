@@ -6,6 +6,7 @@ import os
 from .downloader import bulk_download, manga_download, follows_download, chapter_download
 from .constants import ImpVar
 from .errors import MDownloaderError
+from .image_downloader import close_session, close_writer
 from .legacy import get_id_type, id_from_legacy, convert_ids
 from .model import MDownloader
 
@@ -68,8 +69,6 @@ def file_downloader(md_model: MDownloader) -> None:
                 new_id = link["new_id"]
                 links[links.index(str(old_id))] = new_id
 
-    md_model.wait()
-
     print(api_message)
     for download_id in links:
         try:
@@ -85,18 +84,16 @@ def file_downloader(md_model: MDownloader) -> None:
     print(f'All the ids in {filename} have been downloaded')
 
 
-def main(args: Type[argparse.ArgumentParser.parse_args]) -> None:
-    """Initialise the MDownloader class and call the respective functions.
+def run(md_model: MDownloader) -> None:
+    """Work out what the id is and start the download.
 
     Args:
-        args (argparse.ArgumentParser.parse_args): Command line arguments to parse.
+        md_model (MDownloader): The base class this program runs on.
 
     Raises:
         MDownloaderError: No MangaDex link or id found.
         MDownloaderError: Couldn't find the file to download from.
     """
-    md_model = MDownloader()
-    md_model.args.format_args(args)
     series_id = md_model.id
 
     # Check the id is valid number
@@ -122,3 +119,28 @@ def main(args: Type[argparse.ArgumentParser.parse_args]) -> None:
     else:
         print(api_message)
         check_type(md_model)
+
+
+def main(args: Type[argparse.ArgumentParser.parse_args]) -> None:
+    """Initialise the MDownloader class and call the respective functions.
+
+    Args:
+        args (argparse.ArgumentParser.parse_args): Command line arguments to parse.
+
+    Raises:
+        MDownloaderError: No MangaDex link or id found.
+        MDownloaderError: Couldn't find the file to download from.
+    """
+    md_model = MDownloader()
+    md_model.args.format_args(args)
+
+    try:
+        run(md_model)
+    finally:
+        close_session(md_model)
+        close_writer(md_model)
+        if md_model.debug:
+            md_model.cache.cache_stats()
+            md_model.api.retry.retry_stats()
+        md_model.cache.store.close()
+        md_model.ledger.close()
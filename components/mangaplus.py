@@ -6,19 +6,21 @@ import requests
 from tqdm import tqdm
 
 from .response_pb2 import Response
-from .model import MDownloader
+from .model import ChapterJob, MDownloader
 
 
 class MangaPlus:
 
     def __init__(
             self,
-            md_model: MDownloader) -> None:
+            md_model: MDownloader,
+            job: ChapterJob) -> None:
 
         self.md_model = md_model
-        self.chapter_data = md_model.chapter_data
+        self.job = job
+        self.chapter_data = job.chapter_data
         self.type = md_model.download_type
-        self.exporter = md_model.exporter
+        self.exporter = job.exporter
         self.api_url = self.check_id()
         self.extension = 'jpg'
 
@@ -57,14 +59,13 @@ class MangaPlus:
         viewer = Response.FromString(response.content).success.manga_viewer
         pages = [p.manga_page for p in viewer.pages if p.manga_page.image_url]
 
-        exists = self.md_model.exist.check_exist(pages)
-        self.md_model.exist.before_download(exists)
+        exists = self.md_model.exist.check_exist(self.job, pages)
+        self.md_model.exist.before_download(self.job, exists)
 
         # Decrypt then save each image
-        for page in tqdm(pages, desc=(str(datetime.now(tz=None))[:-7])):
+        for page_no, page in enumerate(tqdm(pages, desc=(str(datetime.now(tz=None))[:-7])), start=1):
             image = self.decrypt_image(page.image_url, page.encryption_key)
-            page_no = pages.index(page) + 1
-            self.exporter.addImage(image, page_no, self.extension)
+            self.exporter.add_image(image, page_no, self.extension)
 
-        downloaded_all = self.md_model.exist.check_exist(pages)
-        self.md_model.exist.after_download(downloaded_all)
+        downloaded_all = self.md_model.exist.check_exist(self.job, pages)
+        self.md_model.exist.after_download(self.job, downloaded_all)
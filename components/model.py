@@ -1,20 +1,28 @@
+import asyncio
 import getpass
-import gzip
 import html
 import json
 import os
+import random
 import re
+import threading
 import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Tuple, Union
+from typing import Optional, Tuple, Union
 
 import requests
+from aiohttp import ClientError, ClientSession, TCPConnector
 from requests.models import Response
 
+from .cache import CacheMemo, CacheStore, load_legacy_cache
 from .constants import ImpVar
 from .errors import MDownloaderError, MDRequestError, NoChaptersError
 from .languages import get_lang_md
+from .ledger import DownloadLedger
 
 
 
@@ -39,11 +47,12 @@ class MDownloaderBase:
         self.manga_data = {}
         self.chapters = []
         self.chapters_data = []
-        self.chapter_data = {}
         self.title_json = None
         self.bulk_json = None
         self.chapter_prefix_dict = {}
-        self.exporter = None
+        self.image_session = None
+        self.image_reporter = None
+        self.export_writer = None
         self.params = {}
         self.cache_json = {}
         self.chapters_archive = []
@@ -54,7 +63,6 @@ class MDownloaderBase:
         self.manga_id = str()
         self.chapter_id = str()
         self.title = str()
-        self.prefix = str()
         self.name = str()
         self.route = str()
         self.chapter_limit = 500
@@ -74,15 +82,336 @@ class MDownloaderBase:
 
 
 
+class ChapterJob:
+
+    def __init__(self, model, chapter_data: dict) -> None:
+        self.chapter_data = chapter_data
+        self.chapter_id = chapter_data["data"]["id"]
+        self.type_id = model.type_id
+        self.title = model.title
+        self.route = model.route
+        self.title_json = model.title_json
+        self.bulk_json = model.bulk_json
+        self.prefix = model.chapter_prefix_dict.get(chapter_data["data"]["attributes"]["volume"], 'c')
+        self.exporter = None
+
+
+
+class RateLimiter(ModelsBase):
+
+    def __init__(self, model) -> None:
+        super().__init__(model)
+        self.rate = ImpVar.API_RATE_LIMIT
+        self.capacity = ImpVar.API_RATE_BURST
+        self.tokens = float(self.capacity)
+        self.last_update = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def refill(self, now: float) -> None:
+        """Add the tokens built up since the last update to the bucket.
+
+        Args:
+            now (float): The current monotonic time.
+        """
+        self.tokens = min(self.capacity, self.tokens + ((now - self.last_update) * self.rate))
+        self.last_update = now
+
+    def reserve(self) -> float:
+        """Take a token if a request can be made now.
+
+        Returns:
+            float: 0 if a token was taken, otherwise how long to wait before trying again.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+
+            if now >= self.blocked_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+
+            time_to_wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+        if self.model.debug: print(f'Rate limited, waiting {time_to_wait:.2f} second(s).')
+        return time_to_wait
+
+    def acquire(self) -> None:
+        """Wait until a request can be made without going over the rate limit."""
+        while (time_to_wait := self.reserve()) > 0:
+            time.sleep(time_to_wait)
+
+    async def acquire_async(self) -> None:
+        """Wait until a request can be made without going over the rate limit, without blocking the event loop."""
+        while (time_to_wait := self.reserve()) > 0:
+            await asyncio.sleep(time_to_wait)
+
+    def block(self, seconds: float) -> None:
+        """Stop any requests from being made for the time specified.
+
+        Args:
+            seconds (float): How long to stop the requests for.
+        """
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def update(self, response: Union[Response, 'ApiResponse']) -> None:
+        """Use the rate limit headers from the api to pause requests if needed.
+
+        Args:
+            response (Union[Response, ApiResponse]): The response of the request.
+        """
+        headers = response.headers
+        retry_after = headers.get('Retry-After')
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_time = headers.get('X-RateLimit-Retry-After')
+
+        try:
+            if retry_after is not None:
+                self.block(float(retry_after))
+            elif response.status_code == 429 or (remaining is not None and int(remaining) <= 0):
+                # The reset time is a unix timestamp
+                seconds = float(reset_time) - time.time() if reset_time is not None else 1 / self.rate
+                self.block(max(seconds, 0))
+        except ValueError:
+            pass
+
+
+
+class RetryPolicy(ModelsBase):
+
+    retry_status_codes = (429, 500, 502, 503, 504)
+
+    def __init__(self, model) -> None:
+        super().__init__(model)
+        self.retries = ImpVar.API_RETRIES
+        self.backoff = ImpVar.API_RETRY_BACKOFF
+        self.max_backoff = ImpVar.API_RETRY_MAX_BACKOFF
+        self.budget = ImpVar.API_RETRY_BUDGET
+        self.lock = threading.Lock()
+        self.retried = 0
+        self.exhausted = 0
+
+    def should_retry(self, method: str, attempt: int, status_code: Optional[int]=None) -> bool:
+        """Check if a failed request should be made again.
+
+        Posts are only retried on a 429, as the api didn't act on them.
+
+        Args:
+            method (str): The http method of the request.
+            attempt (int): How many times the request has been retried.
+            status_code (Optional[int], optional): The response status, None if the request didn't connect. Defaults to None.
+
+        Returns:
+            bool: True if the request should be retried.
+        """
+        if status_code is not None and status_code not in self.retry_status_codes:
+            return False
+
+        if method != 'GET' and status_code != 429:
+            return False
+
+        with self.lock:
+            if attempt >= self.retries or self.retried >= self.budget:
+                self.exhausted += 1
+                return False
+
+            self.retried += 1
+            return True
+
+    def delay(self, attempt: int, response: Optional[Union[Response, 'ApiResponse']]=None) -> float:
+        """How long to wait before retrying, with full jitter so the retries don't all land at once.
+
+        Args:
+            attempt (int): How many times the request has been retried.
+            response (Optional[Union[Response, ApiResponse]], optional): The failed response. Defaults to None.
+
+        Returns:
+            float: The seconds to wait.
+        """
+        time_to_wait = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+        if response is not None:
+            try:
+                time_to_wait = max(time_to_wait, float(response.headers.get('Retry-After', 0)))
+            except ValueError:
+                pass
+
+        if self.model.debug: print(f'Retrying the request in {time_to_wait:.2f} second(s).')
+        return time_to_wait
+
+    def retry_stats(self) -> None:
+        """Print how many api calls were retried."""
+        print(f'Api retries: {self.retried}/{self.budget}, gave up: {self.exhausted}.')
+
+
+
+class ApiResponse:
+
+    def __init__(self, status_code: int, headers: dict, url: str, content: bytes) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self.url = url
+        self.content = content
+
+    def json(self) -> dict:
+        """Parse the response body.
+
+        Raises:
+            json.JSONDecodeError: The body isn't json.
+
+        Returns:
+            dict: The response as a dict object.
+        """
+        return json.loads(self.content)
+
+
+
 class ApiMD(ModelsBase):
 
     def __init__(self, model) -> None:
         super().__init__(model)
         self.session = requests.Session()
+        self.async_session = None
+        self.limiter = RateLimiter(model)
+        self.retry = RetryPolicy(model)
+
+    def get_async_session(self) -> ClientSession:
+        """Get the aiohttp session used for the api calls made inside the event loop, make it if it doesn't exist.
+
+        Returns:
+            ClientSession: The session the async api calls share.
+        """
+        if self.async_session is None or self.async_session.closed:
+            self.async_session = ClientSession(connector=TCPConnector(limit_per_host=ImpVar.CONNECTION_LIMIT_PER_HOST))
+        return self.async_session
+
+    async def close_async_session(self) -> None:
+        """Close the aiohttp session at the end of the run."""
+        if self.async_session is not None and not self.async_session.closed:
+            await self.async_session.close()
+        self.async_session = None
+
+    def auth_headers(self) -> dict:
+        """The login header of the requests session, so the async calls are made as the same user.
+
+        Returns:
+            dict: The headers to send with the async calls.
+        """
+        authorization = self.session.headers.get('Authorization')
+        return {'Authorization': authorization} if authorization else {}
+
+    async def send_async(self, method: str, url: str, **kwargs) -> ApiResponse:
+        """Make an api call with the aiohttp session, retrying it if it fails.
+
+        Args:
+            method (str): The http method.
+            url (str): The url to call.
+
+        Raises:
+            MDownloaderError: The request failed to connect.
+
+        Returns:
+            ApiResponse: The response of the request.
+        """
+        limited = self.limit_request(url)
+        attempt = 0
+
+        while True:
+            if limited: await self.limiter.acquire_async()
+
+            try:
+                async with self.get_async_session().request(method, url, headers=self.auth_headers(), **kwargs) as response:
+                    api_response = ApiResponse(response.status, response.headers, str(response.url), await response.read())
+            except (ClientError, asyncio.TimeoutError) as e:
+                if not self.retry.should_retry(method, attempt):
+                    raise MDownloaderError(f"Couldn't connect to {url}: {e}")
+                await asyncio.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+
+            if limited: self.limiter.update(api_response)
+            if self.model.debug: print(api_response.url)
+
+            if not self.retry.should_retry(method, attempt, api_response.status_code):
+                return api_response
+
+            await asyncio.sleep(self.retry.delay(attempt, api_response))
+            attempt += 1
+
+    async def request_data_async(self, url: str, **params: dict) -> ApiResponse:
+        """Connect to the API and get the response without blocking the event loop.
+
+        Args:
+            url (str): Download url.
+
+        Returns:
+            ApiResponse: The response of the resquest.
+        """
+        # aiohttp only takes strings and numbers, lists are sent as repeated keys
+        query = [(k, str(v)) for k, values in params.items() for v in (values if isinstance(values, list) else [values])]
+        return await self.send_async('GET', url, params=query)
+
+    def limit_request(self, url: str) -> bool:
+        """If the request counts towards the api's rate limit.
+
+        Args:
+            url (str): The url to request.
+
+        Returns:
+            bool: True if the url is an api one, False if not.
+        """
+        return url.startswith(self.model.api_url)
+
+    def send(self, method: str, url: str, **kwargs) -> Response:
+        """Make an api call with the requests session, retrying it if it fails.
+
+        Args:
+            method (str): The http method.
+            url (str): The url to call.
+
+        Raises:
+            MDownloaderError: The request failed to connect.
+
+        Returns:
+            Response: The response of the request.
+        """
+        limited = self.limit_request(url)
+        attempt = 0
+
+        while True:
+            if limited: self.limiter.acquire()
+
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not self.retry.should_retry(method, attempt):
+                    raise MDownloaderError(f"Couldn't connect to {url}: {e}")
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+
+            if limited: self.limiter.update(response)
+            if self.model.debug: print(response.url)
+
+            if not self.retry.should_retry(method, attempt, response.status_code):
+                return response
+
+            time.sleep(self.retry.delay(attempt, response))
+            attempt += 1
 
     def post_data(self, url: str, post_data: dict) -> Response:
-        response = self.session.post(url, json=post_data)
-        return response
+        """Post the data to the api.
+
+        Args:
+            url (str): Post url.
+            post_data (dict): The data to post.
+
+        Returns:
+            Response: The response of the request.
+        """
+        return self.send('POST', url, json=post_data)
 
     def request_data(self, url: str, get_chapters: bool=0, **params: dict) -> Response:
         """Connect to the API and get the response.
@@ -100,9 +429,7 @@ class ApiMD(ModelsBase):
             else:
                 url = f'{url}/feed'
 
-        response = self.session.get(url, params=params)
-        if self.model.debug: print(response.url)
-        return response
+        return self.send('GET', url, params=params)
 
     def check_response_error(self, download_id: str, download_type: str, response: Response, data: dict) -> None:
         """Check if the response status code is 200 or not.
@@ -119,13 +446,13 @@ class ApiMD(ModelsBase):
         if response.status_code != 200:
             raise MDRequestError(download_id, download_type, response, data)
 
-    def convert_to_json(self, download_id: str, download_type: str, response: Response) -> dict:
+    def convert_to_json(self, download_id: str, download_type: str, response: Union[Response, ApiResponse]) -> dict:
         """Convert response data into a parsable json.
 
         Args:
             download_id (str): The id of the download.
             download_type (str): The type of download.
-            response (Response): Response data returned by the api.
+            response (Union[Response, ApiResponse]): Response data returned by the api.
 
         Raises:
             MDRequestError: The response is not JSON serialisable.
@@ -156,6 +483,149 @@ class ApiMD(ModelsBase):
 
 
 
+class ServerLeases(ModelsBase):
+
+    def __init__(self, model) -> None:
+        super().__init__(model)
+        self.lease_time = ImpVar.SERVER_LEASE_TIME
+        self.leases = {}
+        self.fallbacks = {}
+        self.lease_locks = {}
+        self.fallback_locks = {}
+
+    def get_lock(self, locks: dict, chapter_id: str) -> asyncio.Lock:
+        """Get the lock stopping a chapter's node being leased twice at the same time, it's made inside the event loop.
+
+        Each chapter has its own lock so leasing a node doesn't hold up the other chapters.
+
+        Args:
+            locks (dict): The locks of the main or fallback leases.
+            chapter_id (str): The id of the chapter to download.
+
+        Returns:
+            asyncio.Lock: The chapter's lock.
+        """
+        if chapter_id not in locks:
+            locks[chapter_id] = asyncio.Lock()
+        return locks[chapter_id]
+
+    async def lease(self, chapter_id: str) -> dict:
+        """Call the api for the MD@H node to download the chapter's images from.
+
+        Args:
+            chapter_id (str): The id of the chapter to download.
+
+        Returns:
+            dict: The MD@H node and when the lease expires.
+        """
+        server_response = await self.model.api.request_data_async(f'{self.model.mdh_url}/{chapter_id}')
+        server_data = self.model.api.convert_to_json(chapter_id, 'chapter-server', server_response)
+
+        if self.model.debug: print(f'Leased {server_data["baseUrl"]} for {chapter_id}.')
+        return {"baseUrl": server_data["baseUrl"], "expires": time.monotonic() + self.lease_time}
+
+    def check_lease(self, lease: Optional[dict], failed_server: str='') -> bool:
+        """Check if the lease can still be used.
+
+        Args:
+            lease (Optional[dict]): The leased MD@H node.
+            failed_server (str, optional): The node that failed to download. Defaults to ''.
+
+        Returns:
+            bool: True if the lease hasn't expired and the node hasn't failed.
+        """
+        return lease is not None and time.monotonic() < lease["expires"] and lease["baseUrl"] != failed_server
+
+    async def get_server(self, chapter_id: str, failed_server: str='') -> str:
+        """Get the chapter's MD@H node, a new one is leased if it has expired or has failed.
+
+        Args:
+            chapter_id (str): The id of the chapter to download.
+            failed_server (str, optional): The node that failed to download. Defaults to ''.
+
+        Returns:
+            str: The MD@H node to download images from.
+        """
+        return await self.get_lease(self.leases, self.lease_locks, chapter_id, failed_server)
+
+    async def get_fallback(self, chapter_id: str) -> str:
+        """Get a second MD@H node for the chapter to send hedged requests to.
+
+        Args:
+            chapter_id (str): The id of the chapter to download.
+
+        Returns:
+            str: The MD@H node to send hedged requests to, no hedge is sent if it is the same as the main node.
+        """
+        return await self.get_lease(self.fallbacks, self.fallback_locks, chapter_id)
+
+    async def get_lease(self, leases: dict, locks: dict, chapter_id: str, failed_server: str='') -> str:
+        """Get the chapter's lease from the leases given, only one image leases a new node at a time.
+
+        Args:
+            leases (dict): The main or fallback leases.
+            locks (dict): The locks of the leases.
+            chapter_id (str): The id of the chapter to download.
+            failed_server (str, optional): The node that failed to download. Defaults to ''.
+
+        Returns:
+            str: The leased MD@H node.
+        """
+        # Most images use the lease that's already there, which doesn't need the lock
+        lease = leases.get(chapter_id)
+        if self.check_lease(lease, failed_server):
+            return lease["baseUrl"]
+
+        async with self.get_lock(locks, chapter_id):
+            # Another image might have leased a new node while this one was waiting
+            if not self.check_lease(leases.get(chapter_id), failed_server):
+                leases[chapter_id] = await self.lease(chapter_id)
+            return leases[chapter_id]["baseUrl"]
+
+    def release(self, chapter_id: str) -> None:
+        """Forget the chapter's leases once it's downloaded.
+
+        Args:
+            chapter_id (str): The id of the downloaded chapter.
+        """
+        self.leases.pop(chapter_id, None)
+        self.fallbacks.pop(chapter_id, None)
+        self.lease_locks.pop(chapter_id, None)
+        self.fallback_locks.pop(chapter_id, None)
+
+
+
+class LatencyTracker:
+
+    def __init__(self) -> None:
+        self.percentile = ImpVar.HEDGE_PERCENTILE
+        self.min_samples = ImpVar.HEDGE_MIN_SAMPLES
+        self.min_delay = ImpVar.HEDGE_MIN_DELAY
+        self.samples = deque(maxlen=ImpVar.HEDGE_WINDOW)
+
+    def add(self, latency: float) -> None:
+        """Add how long an image took to start downloading.
+
+        Args:
+            latency (float): The seconds until the response started.
+        """
+        self.samples.append(latency)
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long to wait for an image to start downloading before sending a hedged request.
+
+        Returns:
+            Optional[float]: The seconds to wait, None if hedging is off or there aren't enough samples.
+        """
+        if self.percentile <= 0 or len(self.samples) < self.min_samples:
+            return None
+
+        samples = sorted(self.samples)
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return max(samples[index], self.min_delay)
+
+
+
 class AuthMD(ModelsBase):
 
     def __init__(self, model) -> None:
@@ -268,6 +738,7 @@ class ProcessArgs(ModelsBase):
         self.cover_download = bool()
         self.save_chapter_data = bool()
         self.range_download = bool()
+        self.range_expression = str()
         self.search_manga = False
         self.download_in_order = False
 
@@ -290,12 +761,31 @@ class ProcessArgs(ModelsBase):
         self.cover_download = bool(args_dict["covers"])
         self.save_chapter_data = bool(args_dict["json"])
         self.range_download = bool(args_dict["range"])
+        self.range_expression = self.read_range_expression(args_dict.get("chapters"))
         self.download_in_order = bool(args_dict["order"])
         if args_dict["login"]: self.model.auth.login()
         if args_dict["search"]:
             self.search_manga = True
             self.find_manga()
 
+    def read_range_expression(self, chapters_arg: Optional[str]) -> str:
+        """Get the range expression from the argument, or from the file if the argument is a file path.
+
+        Args:
+            chapters_arg (Optional[str]): The --chapters argument.
+
+        Returns:
+            str: The range expression, empty if none was given.
+        """
+        if not chapters_arg:
+            return ''
+
+        if os.path.isfile(chapters_arg):
+            with open(chapters_arg, 'r', encoding='utf8') as fp:
+                # One or more terms per line
+                return ','.join(line.strip() for line in fp if line.strip())
+        return chapters_arg.strip()
+
     def check_archive_extension(self, archive_extension: str) -> str:
         """Check if the file extension is accepted. Default: cbz.
 
@@ -338,41 +828,80 @@ class ProcessArgs(ModelsBase):
 
 class ExistChecker(ModelsBase):
 
-    def check_exist(self, pages: list) -> bool:
+    def check_exist(self, job: ChapterJob, pages: list) -> bool:
         """Check if all the images are downloaded.
 
         Args:
+            job (ChapterJob): The chapter being downloaded.
             pages (list): Array of images from the api.
 
         Returns:
             bool: True if the amount of pages downloaded match the amount on the api, False if not.
         """
-        # Only image files are counted
-        if self.model.args.folder_download:
-            files_path = os.listdir(self.model.exporter.folder_path)
-        else:
-            files_path = self.model.exporter.archive.namelist()
-
-        zip_count = [i for i in files_path if i.endswith(('.png', '.jpg', '.jpeg', '.gif'))]
-
-        if len(pages) == len(zip_count):
+        # Only image files are counted, the exporter keeps count as the images are written
+        if len(pages) == job.exporter.image_count:
             return True
         return False
 
-    def save_json(self) -> None:
-        """Save the chapter data to the data json and save the json."""
-        if self.model.type_id in (1,):
-            self.model.title_json.core()
+    def save_json(self, job: ChapterJob) -> None:
+        """Add the chapter data to the data json's journal, the json is saved once the downloads finish.
+
+        Args:
+            job (ChapterJob): The chapter being downloaded.
+        """
+        if job.type_id in (1,):
+            job.title_json.add_to_journal(job.chapter_id)
+
+        if job.type_id in (2, 3):
+            job.bulk_json.add_to_journal(job.chapter_id)
+
+    def add_chapter_json(self, job: ChapterJob) -> None:
+        """Add the chapter data to the json for title, group or user downloads.
+
+        Args:
+            job (ChapterJob): The chapter being downloaded.
+        """
+        data_to_add = job.chapter_data.copy()
+        if job.type_id in (1,):
+            job.title_json.chapters(data_to_add)
+        if job.type_id in (2, 3):
+            job.bulk_json.chapters(data_to_add)
+
+    def export_format(self) -> str:
+        """The format the chapters are being saved in.
+
+        Returns:
+            str: Either folder or archive.
+        """
+        return 'folder' if self.model.args.folder_download else 'archive'
+
+    def check_ledger(self, chapter_data: dict) -> bool:
+        """Check the download ledger for the chapter, this covers chapters downloaded by any type of download.
+
+        Args:
+            chapter_data (dict): The chapter data from the api.
 
-        if self.model.type_id in (2, 3):
-            self.model.manga_download = False
-            self.model.bulk_json.core()
-            self.model.manga_download = True
+        Returns:
+            bool: True if the chapter has already been downloaded.
+        """
+        if self.model.force_refresh:
+            return False
 
-    def before_download(self, exists: bool) -> None:
+        path = self.model.ledger.downloaded_path(chapter_data, self.export_format())
+        if path is None:
+            return False
+
+        job = ChapterJob(self.model, chapter_data)
+        self.add_chapter_json(job)
+        self.save_json(job)
+        if self.model.debug: print(f'{job.chapter_id} already downloaded to {path}.')
+        return True
+
+    def before_download(self, job: ChapterJob, exists: bool) -> None:
         """Check if the chapter exists before downloading the images.
 
         Args:
+            job (ChapterJob): The chapter being downloaded.
             exists (bool): If the chapter exists or not.
 
         Raises:
@@ -380,22 +909,27 @@ class ExistChecker(ModelsBase):
         """
         if exists:
             # Add chapter data to the json for title, group or user downloads
-            self.save_json()
-            self.model.exporter.close()
+            self.save_json(job)
+            self.model.ledger.record(job.chapter_data, job.exporter.export_path(), self.export_format())
+            job.exporter.remove_parts()
+            job.exporter.close()
             raise MDownloaderError('File already downloaded.')
 
-    def after_download(self, downloaded_all: bool) -> None:
+    def after_download(self, job: ChapterJob, downloaded_all: bool) -> None:
         """Check if all the images have been downloaded.
 
         Args:
+            job (ChapterJob): The chapter being downloaded.
             downloaded_all (bool): If all the images have been downloaded or not.
         """
         # If all the images are downloaded, save the json file with the latest downloaded chapter      
         if downloaded_all:
-            self.save_json()
+            self.save_json(job)
+            self.model.ledger.record(job.chapter_data, job.exporter.export_path(), self.export_format())
+            job.exporter.remove_parts()
 
         # Close the archive
-        self.model.exporter.close()
+        job.exporter.close()
 
 
 
@@ -483,27 +1017,39 @@ class CacheRead(ModelsBase):
         self.cache_refresh_time = ImpVar.CACHE_REFRESH_TIME
         self.root = Path(ImpVar.CACHE_PATH)
         self.root.mkdir(parents=True, exist_ok=True)
+        self.store = CacheStore(self.root)
+        self.memo = CacheMemo(ImpVar.CACHE_MEMORY_ITEMS, ImpVar.CACHE_MEMORY_SIZE * 1024 * 1024)
         self.force_reset_cache_time = "1970-01-01 00:00:00.000000"
 
-    def save_cache(self, cache_time: Union[str, datetime], download_id: str, data: dict={}, chapters: list=[], covers: list=[]) -> None:
+    def save_cache(
+            self,
+            cache_time: Union[str, datetime],
+            download_id: str,
+            data: Optional[dict]=None,
+            chapters: Optional[list]=None,
+            covers: Optional[list]=None) -> None:
         """Save the data to the cache.
 
         Args:
             cache_time (str): The time the cache was saved.
             download_id (str): The id of the data to cache.
-            data (dict, optional): The data to cache. Defaults to {}.
-            chapters (list, optional): The chapters to cache. Defaults to [].
-            covers (list, optional): The covers of the manga.. Defaults to [].
+            data (Optional[dict], optional): The data to cache. Defaults to None.
+            chapters (Optional[list], optional): The chapters to cache. Defaults to None.
+            covers (Optional[list], optional): The covers of the manga. Defaults to None.
         """
         if cache_time == '':
             cache_time = self.force_reset_cache_time
 
-        cache_json = {"cache_date": str(cache_time), "data": data, "covers": covers, "chapters": chapters}
-        cache_file_path = self.root.joinpath(f'{download_id}').with_suffix('.json.gz')
-        if self.model.debug: print(cache_file_path)
+        cache_json = {
+            "cache_date": str(cache_time),
+            "data": data if data is not None else {},
+            "covers": covers if covers is not None else [],
+            "chapters": chapters if chapters is not None else []
+        }
+        if self.model.debug: print(f'Saving {download_id} to the cache.')
 
-        with gzip.open(cache_file_path, 'w') as cache_json_fp:
-            cache_json_fp.write(json.dumps(cache_json, indent=4, ensure_ascii=False).encode('utf-8'))
+        cache_size = self.store.put(download_id, cache_json)
+        self.memo.put(download_id, cache_json, cache_size)
 
     def load_cache(self, download_id: str) -> dict:
         """Load the cache data.
@@ -514,15 +1060,29 @@ class CacheRead(ModelsBase):
         Returns:
             dict: The cache's data.
         """
-        cache_file_path = self.root.joinpath(f'{download_id}').with_suffix('.json.gz')
-        if self.model.debug: print(cache_file_path)
+        cache_json = self.memo.get(download_id)
+        if cache_json is not None:
+            return cache_json
 
-        try:
-            with gzip.open(cache_file_path, 'r') as cache_json_fp:
-                cache_json = json.loads(cache_json_fp.read().decode('utf-8'))
+        if self.model.debug: print(f'Loading {download_id} from the cache.')
+        cache_json, cache_size = self.store.get(download_id)
+        if cache_json is not None:
+            self.memo.put(download_id, cache_json, cache_size)
             return cache_json
-        except (FileNotFoundError, json.JSONDecodeError, gzip.BadGzipFile):
-            return {}
+
+        # Move the old cache file into the database the first time it's used
+        cache_file_path = self.root.joinpath(f'{download_id}').with_suffix('.json.gz')
+        cache_json = load_legacy_cache(cache_file_path)
+        if cache_json.get("cache_date"):
+            cache_size = self.store.put(download_id, cache_json)
+            self.memo.put(download_id, cache_json, cache_size)
+            cache_file_path.unlink(missing_ok=True)
+        return cache_json
+
+    def cache_stats(self) -> None:
+        """Print how often the cache data was found in memory."""
+        memo = self.memo
+        print(f'Cache memory hits: {memo.hits}, misses: {memo.misses}, entries: {len(memo.entries)}, size: {memo.size // 1024}KB.')
 
     def check_cache_time(self, cache_json: dict) -> bool:
         """Check if the cache needs to be refreshed.
@@ -553,6 +1113,85 @@ class CacheRead(ModelsBase):
 
 
 
+class ChapterFilter:
+
+    def __init__(
+            self,
+            group_whitelist: list,
+            group_blacklist: list,
+            user_whitelist: list,
+            user_blacklist: list,
+            languages: list,
+            published_since: str) -> None:
+        self.group_whitelist = frozenset(group_whitelist)
+        self.group_blacklist = frozenset(group_blacklist)
+        self.user_whitelist = frozenset(user_whitelist)
+        self.user_blacklist = frozenset(user_blacklist)
+        self.languages = frozenset(languages)
+        # The api only takes the full date and time
+        self.published_since = f'{published_since}T00:00:00' if len(published_since) == 10 else published_since
+
+    def matches(self, chapter: dict) -> bool:
+        """Check the chapter against the filter rules.
+
+        Whitelisting takes priority with group filtering taking priority over user filtering.
+
+        Args:
+            chapter (dict): The chapter data from the api.
+
+        Returns:
+            bool: True if the chapter should be downloaded.
+        """
+        attributes = chapter["data"]["attributes"]
+
+        if self.languages and attributes["translatedLanguage"] not in self.languages:
+            return False
+
+        # The api dates are ISO 8601 so they can be compared as strings
+        if self.published_since and (attributes.get("publishAt") or '') < self.published_since:
+            return False
+
+        groups = set()
+        users = set()
+        for relationship in chapter["relationships"]:
+            if relationship["type"] == 'scanlation_group':
+                groups.add(relationship["id"])
+            elif relationship["type"] == 'user':
+                users.add(relationship["id"])
+
+        if self.group_whitelist:
+            return not self.group_whitelist.isdisjoint(groups)
+        if self.user_whitelist:
+            return not self.user_whitelist.isdisjoint(users)
+        return self.group_blacklist.isdisjoint(groups) and self.user_blacklist.isdisjoint(users)
+
+    def query_params(self, params: dict) -> dict:
+        """The rules the api can filter by, so the filtered chapters aren't requested.
+
+        The whitelists are only checked locally as the feeds don't all support them.
+
+        Args:
+            params (dict): The parameters already being sent, these aren't replaced.
+
+        Returns:
+            dict: The parameters to add to the chapter requests.
+        """
+        query = {}
+
+        # Long lists are left out to keep the url short, the chapters are still filtered locally
+        if self.group_blacklist and len(self.group_blacklist) <= 100:
+            query["excludedGroups[]"] = sorted(self.group_blacklist)
+        if self.user_blacklist and len(self.user_blacklist) <= 100:
+            query["excludedUploaders[]"] = sorted(self.user_blacklist)
+        if self.languages:
+            query["translatedLanguage[]"] = sorted(self.languages)
+        if self.published_since:
+            query["publishAtSince"] = self.published_since
+
+        return {k: v for k, v in query.items() if k not in params}
+
+
+
 class Filtering(ModelsBase):
 
     def __init__(self, model) -> None:
@@ -568,6 +1207,14 @@ class Filtering(ModelsBase):
         self.user_blacklist = self.read_file(self._user_blacklist_file)
         self.user_whitelist = self.read_file(self._user_userlist_file)
 
+        self.chapter_filter = ChapterFilter(
+            self.group_whitelist,
+            self.group_blacklist,
+            self.user_whitelist,
+            self.user_blacklist,
+            [l.strip() for l in ImpVar.FILTER_LANGUAGES.split(',') if l.strip()],
+            ImpVar.FILTER_PUBLISHED_SINCE)
+
     def read_file(self, file_path: str) -> list:
         """Opens the text file and gets the groups/users to filter.
 
@@ -579,11 +1226,19 @@ class Filtering(ModelsBase):
         """
         try:
             with open(file_path, 'r') as fp:
-                filter_list = [line.rstrip('\n') for line in fp.readlines()]
+                filter_list = [line.strip() for line in fp.readlines() if line.strip()]
                 return filter_list
         except FileNotFoundError:
             return []
-    
+
+    def query_params(self) -> dict:
+        """The filter rules to send with the chapter requests.
+
+        Returns:
+            dict: The parameters to add to the chapter requests.
+        """
+        return self.chapter_filter.query_params(self.model.params)
+
     def filter_chapters(self, chapters: list) -> list:
         """Takes the chapters to download and filters them accordingly.
 
@@ -593,17 +1248,7 @@ class Filtering(ModelsBase):
         Returns:
             list: The filtered chapters.
         """
-        if self.model.filter.group_whitelist or self.model.filter.user_whitelist:
-            if self.model.filter.group_whitelist:
-                chapters = [c for c in chapters if [g["id"] for g in c["relationships"] if g["type"] == 'scanlation_group'] in self.model.filter.group_whitelist]
-            else:
-                if self.model.filter.user_whitelist:
-                    chapters = [c for c in chapters if [u["id"] for u in c["relationships"] if u["type"] == 'user'] in self.model.filter.user_whitelist]
-        else:
-            chapters = [c for c in chapters if 
-                (([g["id"] for g in c["relationships"] if g["type"] == 'scanlation_group'] not in self.model.filter.group_blacklist) 
-                    or [u["id"] for u in c["relationships"] if u["type"] == 'user'] not in self.model.filter.user_blacklist)]
-        return chapters
+        return [c for c in chapters if self.chapter_filter.matches(c)]
 
 
 
@@ -711,12 +1356,149 @@ class MDownloaderMisc(ModelsBase):
                 self.model.cache.save_cache(datetime.now(), manga_id, data=manga_data)
         else:
             manga_data = {"data": manga}
-            self.model.cache.save_cache(datetime.now(), manga_id, data=manga_data)
+            cache_json = self.model.cache.load_cache(manga_id)
+
+            # Don't replace the full manga data already in the cache with the data from the chapter
+            if not cache_json.get('data') or self.model.cache.check_cache_time(cache_json):
+                self.model.cache.save_cache(datetime.now(), manga_id, data=manga_data)
 
         return manga_data
 
 
 
+class ChapterTable:
+
+    def __init__(self, chapters: list) -> None:
+        """Read the chapter numbers and volumes out of the chapters once, in columns.
+
+        Args:
+            chapters (list): The chapters from the api, row i of the table is chapters[i].
+        """
+        self.chapters = chapters
+        self.numbers = []
+        self.volumes = []
+        self.rows_by_number = {}
+
+        for row, chapter in enumerate(chapters):
+            attributes = chapter["data"]["attributes"]
+            self.numbers.append(attributes["chapter"])
+            self.volumes.append(attributes["volume"])
+            self.rows_by_number.setdefault(attributes["chapter"], []).append(row)
+
+        # The distinct chapter numbers sorted naturally, numbers first then anything that isn't a number
+        distinct_numbers = {n for n in self.numbers if n is not None}
+        keyed_numbers = sorted((self.sort_key(n), n) for n in distinct_numbers)
+        self.sorted_numbers = [n for _, n in keyed_numbers]
+        self.sorted_keys = array('d', [key[1] for key, _ in keyed_numbers])
+        self.numeric_count = sum(1 for key, _ in keyed_numbers if key[0] == 0)
+        self.positions = {n: i for i, n in enumerate(self.sorted_numbers)}
+
+        # The rows sorted by volume, only volumes that are numbers can be in a volume range
+        keyed_volumes = sorted((self.sort_key(v)[1], row) for row, v in enumerate(self.volumes) if v is not None and self.sort_key(v)[0] == 0)
+        self.volume_keys = array('d', [key for key, _ in keyed_volumes])
+        self.volume_rows = array('l', [row for _, row in keyed_volumes])
+
+    @staticmethod
+    def sort_key(number: str) -> Tuple[int, float, str]:
+        """Sort the chapter numbers naturally.
+
+        Args:
+            number (str): The chapter number.
+
+        Returns:
+            Tuple[int, float, str]: The key to sort by.
+        """
+        try:
+            return (0, float(number), '')
+        except ValueError:
+            return (1, 0.0, number)
+
+    def select(self, numbers: set) -> list:
+        """Get the chapters with the chapter numbers given, keeping the feed order.
+
+        Args:
+            numbers (set): The chapter numbers to keep.
+
+        Returns:
+            list: The chapters.
+        """
+        return [self.chapters[i] for i, n in enumerate(self.numbers) if n in numbers]
+
+    def number_rows(self, lower: Optional[str], upper: Optional[str]) -> set:
+        """Get the rows of the chapters between the two chapter numbers, inclusive.
+
+        Number bounds are found with a binary search so they don't need to be in the feed.
+        Bounds that aren't numbers need to be in the feed and go by the sorted order.
+
+        Args:
+            lower (Optional[str]): The lowest chapter number, None for no lower bound.
+            upper (Optional[str]): The highest chapter number, None for no upper bound.
+
+        Raises:
+            KeyError: A bound that isn't a number isn't in the feed.
+
+        Returns:
+            set: The rows of the chapters in the range.
+        """
+        start = 0
+        end = len(self.sorted_numbers)
+
+        if lower is not None:
+            key = self.sort_key(lower)
+            start = bisect_left(self.sorted_keys, key[1], 0, self.numeric_count) if key[0] == 0 else self.positions[lower]
+
+        if upper is not None:
+            key = self.sort_key(upper)
+            end = bisect_right(self.sorted_keys, key[1], 0, self.numeric_count) if key[0] == 0 else self.positions[upper] + 1
+        elif lower is not None and self.sort_key(lower)[0] == 0:
+            # A number range with no upper bound stops at the last number
+            end = self.numeric_count
+
+        rows = set()
+        for number in self.sorted_numbers[start:end]:
+            rows.update(self.rows_by_number[number])
+        return rows
+
+    def volume_rows_between(self, lower: Optional[float], upper: Optional[float]) -> set:
+        """Get the rows of the chapters in the volumes between the two volume numbers, inclusive.
+
+        Args:
+            lower (Optional[float]): The lowest volume number, None for no lower bound.
+            upper (Optional[float]): The highest volume number, None for no upper bound.
+
+        Returns:
+            set: The rows of the chapters in the volume range.
+        """
+        start = bisect_left(self.volume_keys, lower) if lower is not None else 0
+        end = bisect_right(self.volume_keys, upper) if upper is not None else len(self.volume_keys)
+        return set(self.volume_rows[start:end])
+
+    def prefixes(self) -> dict:
+        """Assign each volume a prefix, default: c.
+
+        Volumes that share chapter numbers with the volume next to them get their own letter.
+
+        Returns:
+            dict: A mapping of the volume number and the prefix to use.
+        """
+        volume_numbers = {}
+        for volume, number in zip(self.volumes, self.numbers):
+            volume_numbers.setdefault(volume, set()).add(number)
+
+        volumes = list(reversed(list(volume_numbers)))
+        chapter_prefix_dict = {}
+
+        for i, volume in enumerate(volumes):
+            # The last volume is checked against the one before it
+            neighbour = volumes[i + 1] if i + 1 < len(volumes) else volumes[i - 1]
+            shared = not volume_numbers[volume].isdisjoint(volume_numbers[neighbour])
+
+            if volume != '':
+                chapter_prefix_dict[volume] = chr(ord('b') + i + 1) if shared else 'c'
+        return chapter_prefix_dict
+
+
+
 class TitleDownloaderMisc(ModelsBase):
 
     def get_prefixes(self, chapters: list) -> dict:
@@ -728,124 +1510,106 @@ class TitleDownloaderMisc(ModelsBase):
         Returns:
             dict: A mapping of the volume number and the prefix to use.
         """
-        volume_dict = {}
-        chapter_prefix_dict = {}
+        return ChapterTable(chapters).prefixes()
 
-        # Loop over the chapters and add the chapter numbers to the volume number dict
-        for c in chapters:
-            c = c["data"]["attributes"]
-            volume_no = c["volume"]
-            try:
-                volume_dict[volume_no].append(c["chapter"])
-            except KeyError:
-                volume_dict[volume_no] = [c["chapter"]]
+    def get_range_rows(self, table: ChapterTable, term: str) -> set:
+        """Get the rows of the chapters a single range term covers.
 
-        list_volume_dict = list(reversed(list(volume_dict)))
-        prefix = 'b'
+        Terms: all, a chapter (5), a range (10-18), open ranges (250- or -20),
+        a volume (v3) or a volume range (v3-v5, v3-).
 
-        # Loop over the volume dict list and
-        # check if the current iteration has the same chapter numbers as the volume before and after
-        for volume in list_volume_dict:
-            next_volume_index = list_volume_dict.index(volume) + 1
-            previous_volume_index = list_volume_dict.index(volume) - 1
-            result = False
+        Args:
+            table (ChapterTable): The manga's chapters.
+            term (str): The range term.
+
+        Returns:
+            set: The rows of the chapters the term covers.
+        """
+        if term == 'all':
+            return set(range(len(table.chapters)))
+
+        if term[:1] in ('v', 'V'):
+            lower, _, upper = term[1:].partition('-')
+            lower = lower.strip()
+            upper = upper.strip().lstrip('vV').strip() if '-' in term else lower
 
             try:
-                next_item = list_volume_dict[next_volume_index]
-                result = any(elem in volume_dict[next_item] for elem in volume_dict[volume])
-            except (KeyError, IndexError):
-                previous_volume = list_volume_dict[previous_volume_index]
-                result = any(elem in volume_dict[previous_volume] for elem in volume_dict[volume])
+                return table.volume_rows_between(float(lower) if lower else None, float(upper) if upper else None)
+            except ValueError:
+                print(f'Volume range {term} is not valid. Skipping.')
+                return set()
 
-            if volume != '':
-                if result:
-                    vol_prefix = chr(ord(prefix) + next_volume_index)
-                else:
-                    vol_prefix = 'c'
-                chapter_prefix_dict.update({volume: vol_prefix})
-        return chapter_prefix_dict
+        if '-' in term:
+            lower, _, upper = term.partition('-')
+            lower = lower.strip() or None
+            upper = upper.strip() or None
 
-    def natsort(self, x) -> Union[float, str]:
-        """Sort the chapter numbers naturally."""
-        try:
-            return float(x)
-        except ValueError:
-            return x
+            try:
+                rows = table.number_rows(lower, upper)
+            except KeyError as e:
+                print(f'Chapter {e.args[0]} does not exist. Skipping {term}.')
+                return set()
+
+            if not rows:
+                print(f'No chapters between {lower or "the start"} and {upper or "the end"}. Skipping {term}.')
+            return rows
+
+        if term not in table.rows_by_number:
+            print(f'Chapter {term} does not exist. Skipping.')
+            return set()
+        return set(table.rows_by_number[term])
 
-    def get_chapters_range(self, chapters_list: list, chap_list: list) -> list:
-        """Loop through the lists and get the chapters between the upper and lower bounds.
+    def select_chapters(self, table: ChapterTable, expression: str) -> list:
+        """Get the chapters a range expression covers, e.g. "250-, !260, v1-v3".
+
+        Terms are separated by commas, a "!" in front of a term excludes its chapters.
+        If the expression only has exclusions, every other chapter is downloaded.
 
         Args:
-            chapters_list (list): All the chapters in the manga.
-            chap_list (list): A list of chapter numbers to download.
+            table (ChapterTable): The manga's chapters.
+            expression (str): The range expression.
 
         Returns:
-            list: The chapter numbers to download the data of.
+            list: The chapters to download, in feed order.
         """
-        chapters_range = []
+        terms = [t.strip() for t in expression.split(',') if t.strip()]
+        include_terms = [t for t in terms if not t.startswith('!')]
+        exclude_terms = [t.lstrip('!').strip() for t in terms if t.startswith('!')]
 
-        for c in chap_list:
-            if "-" in c:
-                chapter_range = c.split('-')
-                lower_bound = chapter_range[0].strip()
-                upper_bound = chapter_range[1].strip()
-                try:
-                    lower_bound_i = chapters_list.index(lower_bound)
-                except ValueError:
-                    print(f'Chapter {lower_bound} does not exist. Skipping {c}.')
-                    continue
-                try:
-                    upper_bound_i = chapters_list.index(upper_bound)
-                except ValueError:
-                    print(f'Chapter {upper_bound} does not exist. Skipping {c}.')
-                    continue
-                c = chapters_list[lower_bound_i:upper_bound_i+1]
-            else:
-                try:
-                    c = [chapters_list[chapters_list.index(c)]]
-                except ValueError:
-                    print(f'Chapter {c} does not exist. Skipping.')
-                    continue
-            chapters_range.extend(c)
-        return chapters_range
+        rows = set()
+        for term in (include_terms or ['all']):
+            rows.update(self.get_range_rows(table, term))
+
+        for term in exclude_terms:
+            rows.difference_update(self.get_range_rows(table, term))
 
+        return [table.chapters[row] for row in sorted(rows)]
 
     def download_range_chapters(self, chapters: list) -> list:
         """Check which chapters you want to download.
 
+        The range given with --chapters is used if there is one, otherwise the range is asked for.
+
         Args:
             chapters (list): The chapters to get the chapter numbers.
 
+        Raises:
+            MDownloaderError: No range was given.
+
         Returns:
             list: The chapters to download.
         """
-        chapters_list = [c["data"]["attributes"]["chapter"] for c in chapters]
-        chapters_list = list(set(chapters_list))
-        chapters_list.sort(key=self.natsort)
-        remove_chapters = []
-
-        print(f'Available chapters:\n{", ".join(chapters_list)}')
-        chap_list = input("\nEnter the chapter(s) to download: ").strip()
-
-        if not chap_list:
-            raise MDownloaderError('No chapter(s) chosen.')
+        table = ChapterTable(chapters)
+        expression = self.model.args.range_expression
 
-        chap_list = [c.strip() for c in chap_list.split(',')]
-        chapters_to_remove = [c.strip('!') for c in chap_list if '!' in c]
-        chap_list = [c for c in chap_list if '!' not in c]
+        if not expression:
+            print(f'Available chapters:\n{", ".join(table.sorted_numbers)}')
+            expression = input("\nEnter the chapter(s) to download: ").strip()
 
-        # Find which chapters to download
-        if 'all' not in chap_list:
-            chapters_to_download = self.get_chapters_range(chapters_list, chap_list)
-        else:
-            chapters_to_download = chapters_list
-
-        # Get the chapters to remove from the download list
-        remove_chapters = self.get_chapters_range(chapters_list, chapters_to_remove)
+            if not expression:
+                raise MDownloaderError('No chapter(s) chosen.')
 
-        for i in remove_chapters:
-            chapters_to_download.remove(i)
-        return [c for c in chapters if c["data"]["attributes"]["chapter"] in chapters_to_download]
+        return self.select_chapters(table, expression)
 
 
 
@@ -855,26 +1619,14 @@ class MDownloader(MDownloaderBase):
         super().__init__()
 
         self.api = ApiMD(self)
+        self.leases = ServerLeases(self)
+        self.latency = LatencyTracker()
         self.auth = AuthMD(self)
         self.formatter = DataFormatter(self)
         self.args = ProcessArgs(self)
         self.exist = ExistChecker(self)
         self.cache = CacheRead(self)
+        self.ledger = DownloadLedger(Path(ImpVar.LEDGER_PATH))
         self.filter = Filtering(self)
         self.misc = MDownloaderMisc(self)
         self.title_misc = TitleDownloaderMisc(self)
-
-    def wait(self, time_to_wait: int=ImpVar.GLOBAL_TIME_TO_WAIT, print_message: bool=False) -> None:
-        """Wait a certain amount of time before continuing.
-
-        Args:
-            time_to_wait (int, optional): The time to wait. Defaults to ImpVar.GLOBAL_TIME_TO_WAIT.
-            print_message (bool, optional): If to print the waiting message. Defaults to False.
-        """
-        if time_to_wait == 0:
-            return
-
-        if print_message:
-            print(f"Waiting {time_to_wait} second(s).")
-
-        time.sleep(time_to_wait)
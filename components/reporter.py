@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+import asyncio
+import time
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+from .constants import ImpVar
+from .model import MDownloader
+
+
+
+class ImageReporter:
+
+    def __init__(self, md_model: MDownloader, session: ClientSession) -> None:
+        self.md_model = md_model
+        self.session = session
+        self.report_url = md_model.report_url
+        self.batch_size = ImpVar.REPORT_BATCH_SIZE
+        self.queue = asyncio.Queue(maxsize=ImpVar.REPORT_QUEUE_SIZE)
+        self.timeout = ClientTimeout(total=ImpVar.REPORT_TIMEOUT)
+        self.worker = None
+        self.sample_count = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def under_pressure(self) -> bool:
+        """If the queue is more than half full.
+
+        Returns:
+            bool: True if the reports should be sampled, False if not.
+        """
+        return self.queue.qsize() >= (self.queue.maxsize // 2)
+
+    def report(self, success: bool, image_link: str, img_size: int, start_time: float) -> None:
+        """Queue the image report without waiting for it to be sent.
+
+        Args:
+            success (bool): If the image was downloaded or not.
+            image_link (str): The url of the image.
+            img_size (int): The size in bytes of the image.
+            start_time (float): When the request was started.
+        """
+        end_time = time.time()
+        elapsed_time = int((end_time - start_time) * 1000)
+
+        data = {
+            "url": image_link,
+            "success": success,
+            "bytes": img_size,
+            "duration": elapsed_time
+        }
+
+        # Only keep every few successful reports when the queue is filling up, failures are always kept
+        if success and self.under_pressure():
+            self.sample_count += 1
+            if self.sample_count % ImpVar.REPORT_SAMPLE_RATE != 0:
+                self.dropped += 1
+                return
+
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.ensure_future(self.send_reports())
+
+    async def post_report(self, data: dict) -> None:
+        """Send a single report to the MD@H network.
+
+        Args:
+            data (dict): The report data.
+        """
+        try:
+            async with self.session.post(self.report_url, json=data, timeout=self.timeout) as response:
+                await response.release()
+            self.sent += 1
+        except (ClientError, ConnectionResetError, asyncio.TimeoutError):
+            self.dropped += 1
+
+    async def send_reports(self) -> None:
+        """Take the queued reports in batches and send them."""
+        while not self.queue.empty():
+            batch = [self.queue.get_nowait()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            await asyncio.gather(*[self.post_report(data) for data in batch])
+
+            for _ in batch:
+                self.queue.task_done()
+
+            if self.md_model.debug: print(f'Reported {len(batch)} image(s).')
+
+    async def flush(self) -> None:
+        """Wait for the queued reports to be sent."""
+        if self.worker is None:
+            return
+
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=ImpVar.REPORT_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Give up on the reports still queued rather than hold up the downloads
+            self.worker.cancel()
+            self.dropped += self.queue.qsize()
+            self.queue = asyncio.Queue(maxsize=ImpVar.REPORT_QUEUE_SIZE)
+
+        if self.md_model.debug: print(f'Image reports sent: {self.sent}, dropped: {self.dropped}.')
@@ -129,6 +129,8 @@ if __name__ == "__main__":
     parser.add_argument('--json', '-j', default=True, const=False, nargs='?', help='Add the chapter data as a json in the chapter archive/folder.')
     parser.add_argument('--range', '-r', default=True, const=False, nargs='?',
         help='Download a range of chapters, or all while excluding some. Put "!" in front of the chapters you want to exclude.')
+    parser.add_argument('--chapters', default=None,
+        help='Chapters to download without being asked, e.g. "250-", "1-10, !5", "v3-v5". Can also be a file with the range.')
     parser.add_argument('--search', '-s', default=False, const=True, nargs='?', 
         help='Search for the manga specified. Wrap multiple words in quotation marks, e.g. "Please Put These On, Takamine-san"')
     parser.add_argument('--order', '-o', default=False, const=True, nargs='?', help='Download chapters in descending order instead of grouping by manga.')